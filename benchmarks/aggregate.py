@@ -0,0 +1,87 @@
+"""
+Compare answering "count and area of each class_id in a region" by paging
+through /polygons/search/, with /polygons/aggregate/ on gis_polygon and
+with /polygons/aggregate/ on the rollup.
+
+Seeds ROWS random polygons with their measures, so run it only against a
+disposable PostGIS database migrated with manage.py migrateschema:
+    python -m benchmarks.aggregate
+"""
+import collections
+from sqlalchemy import text
+from .common import best_of, print_table, setup_django
+
+ROWS = 1000000
+NAME = 'aggregate benchmark'
+REGION = '0,0,11.25,11.25'
+CASES = [('class_id', {'bbox': REGION}),
+         ('class_id', {}),
+         ('grid', {'group_by': 'grid', 'resolution': 4})]
+
+SEED = """
+INSERT INTO gis_polygon (name, class_id, geom, area, min_x, min_y, max_x,
+                         max_y, centroid_x, centroid_y)
+SELECT :name, class_id, geom, ST_Area(geom::geography), ST_XMin(geom),
+       ST_YMin(geom), ST_XMax(geom), ST_YMax(geom), ST_X(ST_Centroid(geom)),
+       ST_Y(ST_Centroid(geom))
+FROM (SELECT (random() * 10)::int AS class_id,
+             ST_Expand(ST_SetSRID(ST_MakePoint(random() * 360 - 180,
+                                               random() * 170 - 85), 4326),
+                       0.01) AS geom
+      FROM generate_series(1, :rows)) AS seed
+"""
+
+
+def search_api(client, params):
+    """
+    Counts and areas by class_id summed on the client from search pages.
+    """
+    totals = collections.defaultdict(lambda: [0, 0.0])
+    after = 0
+    while after is not None:
+        content = client.get('/polygons/search/', dict(
+            params, limit=1000, after=after)).json()
+        for polygon in content['results']:
+            totals[polygon['class_id']][0] += 1
+            totals[polygon['class_id']][1] += polygon['area']
+        after = content['next_after']
+    return totals
+
+
+def main():
+    setup_django()
+    from django.core.management import call_command
+    from django.test import Client
+    from polygons.models import engine
+
+    client = Client()
+    with engine.begin() as connection:
+        connection.execute(text(SEED), {'name': NAME, 'rows': ROWS})
+        connection.execute(text('ANALYZE gis_polygon'))
+    rows = []
+    try:
+        call_command('refreshrollup')
+        for group_by, params in CASES:
+            url = '/polygons/aggregate/'
+            database = best_of(
+                lambda: client.get(url, dict(params, rollup='0')), repeat=3)
+            rollup = best_of(lambda: client.get(url, params), repeat=3)
+            search = '-'
+            if 'bbox' in params:
+                search = '%.1f' % (best_of(
+                    lambda: search_api(client, params), repeat=1) * 1000)
+            rows.append([group_by, params.get('bbox', 'world'), search,
+                         '%.1f' % (database * 1000),
+                         '%.1f' % (rollup * 1000)])
+    finally:
+        with engine.begin() as connection:
+            connection.execute(
+                text('DELETE FROM gis_polygon WHERE name = :name'),
+                {'name': NAME})
+        call_command('refreshrollup')
+    print_table(['group by', 'region', 'search API ms', 'database ms',
+                 'rollup ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Compare reading N polygons with N DetailView requests and with one
+BatchView request.
+
+Run from the project root against a disposable PostGIS database:
+    python -m benchmarks.batch_read
+"""
+from .common import best_of, make_polygon, print_table, setup_django
+
+NAME = 'batch read benchmark'
+COUNTS = [50, 500]
+VERTICES = 100
+CRS = ['epsg:4326', 'epsg:32644']
+
+
+def main():
+    setup_django()
+    from django.test import Client, override_settings
+    from django.urls import reverse
+    from polygons.models import GisPolygon, Session
+
+    client = Client()
+    polygon = {'name': NAME,
+               'geom': {'polygon': make_polygon(VERTICES).wkt}}
+    response = client.post(reverse('polygons:bulk'),
+                           content_type='application/json',
+                           data=[polygon] * max(COUNTS))
+    assert response.status_code == 201, response.content[:200]
+    ids = [result['id'] for result in response.json()]
+    rows = []
+    try:
+        with override_settings(POLYGONS_RESPONSE_CACHE=False):
+            for count in COUNTS:
+                urls = [reverse('polygons:detail',
+                                kwargs={'polygon_id': polygon_id})
+                        for polygon_id in ids[:count]]
+                batch_ids = ','.join(map(str, ids[:count]))
+                for crs in CRS:
+                    def sequential():
+                        for url in urls:
+                            client.get(url, {'crs': crs})
+
+                    def batch():
+                        b''.join(client.get(
+                            reverse('polygons:batch'),
+                            {'ids': batch_ids, 'crs': crs}).streaming_content)
+
+                    sequential_time = best_of(sequential, repeat=3)
+                    batch_time = best_of(batch, repeat=3)
+                    rows.append([count, crs,
+                                 '%.1f' % (sequential_time * 1000),
+                                 '%.1f' % (batch_time * 1000),
+                                 '%.1fx' % (sequential_time / batch_time)])
+    finally:
+        with Session() as session:
+            with session.begin():
+                session.query(GisPolygon).filter_by(name=NAME).delete()
+    print_table(['polygons', 'crs', 'detail calls ms', 'batch ms',
+                 'speedup'], rows)
+
+
+if __name__ == '__main__':
+    main()
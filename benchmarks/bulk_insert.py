@@ -0,0 +1,58 @@
+"""
+Compare polygon ingest throughput of IndexView.post and BulkView.post.
+
+Run from the project root against a disposable PostGIS database:
+    python -m benchmarks.bulk_insert
+"""
+import json
+import time
+from .common import make_polygon, print_table, setup_django
+
+BATCH_SIZES = [100, 1000, 10000]
+VERTICES = 100
+
+
+def payload(count):
+    polygon = make_polygon(VERTICES)
+    return [{'name': 'polygon %d' % i, 'class_id': i % 10,
+             'props': {'index': i},
+             'geom': {'polygon': polygon.wkt, 'crs': 'EPSG:4326'}}
+            for i in range(count)]
+
+
+def main():
+    setup_django()
+    from django.test import Client
+    from django.urls import reverse
+    from polygons.models import GisPolygon, Session
+
+    client = Client()
+    rows = []
+    for count in BATCH_SIZES:
+        items = payload(count)
+        start = time.perf_counter()
+        for item in items:
+            response = client.post(reverse('polygons:index'),
+                                   content_type='application/json', data=item)
+            assert response.status_code == 201, response.content
+        single = time.perf_counter() - start
+        start = time.perf_counter()
+        response = client.post(reverse('polygons:bulk'),
+                               content_type='application/json',
+                               data=json.dumps(items))
+        bulk = time.perf_counter() - start
+        assert response.status_code == 201, response.content[:200]
+        rows.append([count,
+                     '%.0f' % (count / single),
+                     '%.0f' % (count / bulk),
+                     '%.1fx' % (single / bulk)])
+        with Session() as session:
+            with session.begin():
+                session.query(GisPolygon).filter(
+                    GisPolygon.name.like('polygon %')).delete(
+                        synchronize_session=False)
+    print_table(['polygons', 'single/s', 'bulk/s', 'speedup'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import math
+import os
+import time
+from shapely.geometry import Polygon
+
+
+def make_polygon(vertices, holes=0, center=(81.0, 20.0), radius=0.1):
+    """
+    Star-shaped polygon with roughly `vertices` points in EPSG:4326.
+
+    The default center lies inside UTM zone 44N (EPSG:32644), so the polygon
+    can be reprojected into every supported CRS.
+    """
+    def ring(n, r, phase=0.0):
+        cx, cy = center
+        points = []
+        for i in range(n):
+            angle = 2 * math.pi * i / n + phase
+            scale = r * (1.0 if i % 2 else 0.8)
+            points.append((cx + scale * math.cos(angle),
+                           cy + scale * math.sin(angle)))
+        return points
+
+    hole_vertices = max(4, vertices // 10) if holes else 0
+    shell = ring(max(4, vertices - holes * hole_vertices), radius)
+    interiors = []
+    for i in range(holes):
+        angle = 2 * math.pi * i / holes
+        hole_center = (center[0] + radius * 0.4 * math.cos(angle),
+                       center[1] + radius * 0.4 * math.sin(angle))
+        interiors.append(
+            [(x - center[0] + hole_center[0], y - center[1] + hole_center[1])
+             for x, y in ring(hole_vertices, radius * 0.1)])
+    return Polygon(shell, interiors)
+
+
+def setup_django():
+    """
+    Configure Django for benchmarks that go through views or the database.
+
+    The database is the one polygons.models connects to, so POSTGRES_PASS and
+    POSTGRES_DB must point to a disposable PostGIS instance.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
+    import django
+    django.setup()
+
+
+def best_of(func, repeat=5, number=1):
+    """
+    Best wall time of `func` in seconds per call, as timeit recommends.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) / number)
+    return min(timings)
+
+
+def print_table(header, rows):
+    widths = [max(len(str(cell)) for cell in column)
+              for column in zip(header, *rows)]
+    for row in [header, *rows]:
+        print('  '.join(str(cell).rjust(width)
+                        for cell, width in zip(row, widths)))
@@ -0,0 +1,58 @@
+"""
+Throughput of manage.py importpolygons with and without worker processes.
+
+Imports ROWS polygons from a generated NDJSON file, so run it only against
+a disposable PostGIS database:
+    python -m benchmarks.importer
+"""
+import json
+import os
+import tempfile
+import time
+from .common import make_polygon, print_table, setup_django
+
+ROWS = 100000
+VERTICES = 100
+NAME = 'import benchmark'
+WORKERS = [0, 2, os.cpu_count()]
+
+
+def write_input(path):
+    geometry = make_polygon(VERTICES).__geo_interface__
+    with open(path, 'w') as f:
+        for i in range(ROWS):
+            f.write(json.dumps({
+                'type': 'Feature', 'geometry': geometry,
+                'properties': {'name': NAME, 'class_id': i % 10,
+                               'index': i}}) + '\n')
+
+
+def main():
+    setup_django()
+    from sqlalchemy import text
+    from polygons.importer import import_polygons
+    from polygons.models import engine
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'polygons.ndjson')
+        write_input(path)
+        try:
+            for workers in WORKERS:
+                start = time.perf_counter()
+                import_polygons(path, workers=workers, restart=True,
+                                log=lambda message: None)
+                elapsed = time.perf_counter() - start
+                rows.append([workers, '%.1f' % elapsed,
+                             '%.0f' % (ROWS / elapsed),
+                             '%.1fM' % (ROWS / elapsed * 3600 / 1e6)])
+        finally:
+            with engine.begin() as connection:
+                connection.execute(
+                    text('DELETE FROM gis_polygon WHERE name = :name'),
+                    {'name': NAME})
+    print_table(['workers', 's', 'polygons/s', 'per hour'], rows)
+
+
+if __name__ == '__main__':
+    main()
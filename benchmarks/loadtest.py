@@ -0,0 +1,84 @@
+"""
+Load test of the sync views under WSGI against the async views under ASGI.
+
+Start both servers against the same database, e.g.
+    gunicorn mysite.wsgi -w 4 --threads 8 -b :8000
+    uvicorn mysite.asgi:application --workers 4 --port 8001
+then run from the project root:
+    python -m benchmarks.loadtest --wsgi http://localhost:8000 \\
+        --asgi http://localhost:8001 --concurrency 256 --requests 10000
+
+Needs httpx, see requirements-bench.txt.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+from .common import make_polygon, print_table
+
+CASES = [
+    ('wsgi', '/polygons/%d/'),
+    ('asgi', '/polygons/async/%d/'),
+]
+
+
+async def run(base_url, path, concurrency, requests, params):
+    latencies = []
+    errors = 0
+    remaining = requests
+
+    async def worker(client):
+        nonlocal errors, remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            response = await client.get(path, params=params)
+            latencies.append(time.perf_counter() - start)
+            errors += response.status_code != 200
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits,
+                                 timeout=60) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100)
+    return [requests / elapsed, quantiles[49] * 1000, quantiles[94] * 1000,
+            quantiles[98] * 1000, errors]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--wsgi', default='http://localhost:8000')
+    parser.add_argument('--asgi', default='http://localhost:8001')
+    parser.add_argument('--concurrency', type=int, default=256)
+    parser.add_argument('--requests', type=int, default=10000)
+    parser.add_argument('--vertices', type=int, default=10000)
+    parser.add_argument('--crs', default='epsg:32644')
+    args = parser.parse_args()
+
+    polygon = {'name': 'load test',
+               'geom': {'polygon': make_polygon(args.vertices).wkt}}
+    response = httpx.post(args.wsgi + '/polygons/', json=polygon)
+    response.raise_for_status()
+    polygon_id = response.json()['id']
+    rows = []
+    try:
+        for server, path in CASES:
+            base_url = args.wsgi if server == 'wsgi' else args.asgi
+            result = asyncio.run(run(base_url, path % polygon_id,
+                                     args.concurrency, args.requests,
+                                     {'crs': args.crs}))
+            rows.append([server, '%.0f' % result[0]] +
+                        ['%.1f' % latency for latency in result[1:4]] +
+                        [result[4]])
+    finally:
+        httpx.delete('%s/polygons/%d/' % (args.wsgi, polygon_id))
+    print_table(['server', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'errors'],
+                rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Bytes transferred and DetailView.get latency for each level of detail and
+for on the fly simplification with the same tolerances.
+
+Run from the project root against a disposable PostGIS database:
+    python -m benchmarks.lod
+"""
+from .common import best_of, make_polygon, print_table, setup_django
+
+VERTEX_COUNTS = [10000, 100000]
+
+
+def main():
+    setup_django()
+    from django.test import Client, override_settings
+    from django.urls import reverse
+    from polygons.lod import tolerances
+    from polygons.models import GisPolygon, Session
+
+    client = Client()
+    rows = []
+    for vertices in VERTEX_COUNTS:
+        response = client.post(
+            reverse('polygons:index'), content_type='application/json',
+            data={'name': 'lod benchmark',
+                  'geom': {'polygon': make_polygon(vertices, holes=2).wkt}})
+        assert response.status_code == 201, response.content
+        url = reverse('polygons:detail',
+                      kwargs={'polygon_id': response.json()['id']})
+        cases = [('lod=0', {})]
+        for lod, tolerance in enumerate(tolerances(), 1):
+            cases.append(('lod=%d' % lod, {'lod': lod}))
+            cases.append(('tolerance=%g' % tolerance,
+                          {'tolerance': tolerance}))
+        for name, params in cases:
+            with override_settings(POLYGONS_RESPONSE_CACHE=False):
+                size = len(client.get(url, params).content)
+                timing = best_of(lambda: client.get(url, params))
+            rows.append([vertices, name, size, '%.2f' % (timing * 1000)])
+    with Session() as session:
+        with session.begin():
+            session.query(GisPolygon).filter_by(name='lod benchmark').delete()
+    print_table(['vertices', 'detail', 'bytes', 'ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
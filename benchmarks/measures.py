@@ -0,0 +1,103 @@
+"""
+Compare reading the measures of polygons stored on write with computing
+them on every read.
+
+Clients used to parse the WKT of every polygon, reproject it and measure
+it. Sorting by area had to compute ST_Area of every row, while the stored
+column is served by idx_gis_polygon_area.
+
+The first part runs in memory. The second seeds ROWS polygons, so run it
+only against a disposable PostGIS database (migrate it first with
+manage.py migrateschema):
+    python -m benchmarks.measures
+"""
+import json
+from sqlalchemy import text
+from .common import best_of, make_polygon, print_table, setup_django
+
+ROWS = 200000
+NAME = 'measures benchmark'
+POLYGONS = 1000
+VERTICES = [10, 1000]
+
+SEED = """
+INSERT INTO gis_polygon (name, geom, area, vertex_count)
+SELECT :name, geom, ST_Area(geom::geography), ST_NPoints(geom)
+FROM (SELECT ST_Expand(ST_SetSRID(ST_MakePoint(random() * 360 - 180,
+                                               random() * 170 - 85), 4326),
+                       random() * 0.1) AS geom
+      FROM generate_series(1, :rows)) AS seed
+"""
+
+COMPUTED = """
+EXPLAIN (ANALYZE, FORMAT JSON)
+SELECT id FROM gis_polygon ORDER BY ST_Area(geom::geography) DESC, id DESC
+LIMIT 100
+"""
+
+STORED = """
+EXPLAIN (ANALYZE, FORMAT JSON)
+SELECT id FROM gis_polygon WHERE area IS NOT NULL
+ORDER BY area DESC, id DESC LIMIT 100
+"""
+
+
+def client_side():
+    import shapely.wkt
+    from polygons.crs import reproject_many, transformers
+    from polygons.measures import measure
+
+    rows = []
+    for vertices in VERTICES:
+        wkts = [make_polygon(vertices).wkt] * POLYGONS
+        stored = [measure(shapely.wkt.loads(wkt)) for wkt in wkts]
+        transformer = transformers.get('EPSG:4326', 'EPSG:32644')
+
+        def computed():
+            polygons = reproject_many(
+                [shapely.wkt.loads(wkt) for wkt in wkts], transformer)
+            [(p.area, p.length, p.bounds, p.centroid) for p in polygons]
+
+        def read():
+            [(m['area'], m['perimeter'], m['min_x'], m['centroid_x'])
+             for m in stored]
+
+        rows.append([vertices, '%.2f' % (best_of(computed) * 1000),
+                     '%.3f' % (best_of(read) * 1000)])
+    print_table(['vertices', 'parse + measure ms', 'stored ms'], rows)
+
+
+def explain(connection, query):
+    plan = connection.execute(text(query)).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    node = plan[0]['Plan']
+    while node['Node Type'] in ('Limit', 'Gather Merge') and 'Plans' in node:
+        node = node['Plans'][0]
+    return node['Node Type'], plan[0]['Execution Time']
+
+
+def main():
+    setup_django()
+    client_side()
+    from polygons.models import engine
+
+    with engine.begin() as connection:
+        connection.execute(text(SEED), {'name': NAME, 'rows': ROWS})
+        connection.execute(text('ANALYZE gis_polygon'))
+    try:
+        with engine.begin() as connection:
+            rows = [[name, *explain(connection, query)]
+                    for name, query in (('ST_Area', COMPUTED),
+                                        ('area column', STORED))]
+    finally:
+        with engine.begin() as connection:
+            connection.execute(
+                text('DELETE FROM gis_polygon WHERE name = :name'),
+                {'name': NAME})
+    print_table(['sort by', 'plan', 'ms'],
+                [[name, node, '%.1f' % ms] for name, node, ms in rows])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Latency of small geometry payloads mixed with huge ones, with the large
+payloads parsed inline and in geometry_executor's process pool.
+
+Threads stand in for the request threads of one worker: a few of them keep
+parsing and reprojecting huge polygons, the others time small ones.
+
+Run from the project root:
+    python -m benchmarks.offload
+"""
+import statistics
+import threading
+import time
+from django.test import override_settings
+from .common import make_polygon, print_table, setup_django
+
+SMALL_VERTICES = 100
+LARGE_VERTICES = 200000
+SMALL_THREADS = 4
+LARGE_THREADS = 2
+DURATION = 5.0
+
+
+def run(field, small, large):
+    latencies = []
+    stop = threading.Event()
+
+    def small_traffic():
+        while not stop.is_set():
+            start = time.perf_counter()
+            field.to_internal_value(small)
+            latencies.append(time.perf_counter() - start)
+
+    def large_traffic():
+        while not stop.is_set():
+            field.to_internal_value(large)
+
+    threads = [threading.Thread(target=small_traffic)
+               for _ in range(SMALL_THREADS)]
+    threads += [threading.Thread(target=large_traffic)
+                for _ in range(LARGE_THREADS)]
+    for thread in threads:
+        thread.start()
+    time.sleep(DURATION)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def main():
+    setup_django()
+    from polygons.executor import geometry_executor
+    from polygons.serializers import GeometryField
+    field = GeometryField()
+    field._context = {}
+    small = {'polygon': make_polygon(SMALL_VERTICES).wkt, 'crs': 'EPSG:32644'}
+    large = {'polygon': make_polygon(LARGE_VERTICES, holes=2).wkt,
+             'crs': 'EPSG:4326'}
+    rows = []
+    for name, processes in [('inline', 0), ('offloaded', LARGE_THREADS)]:
+        with override_settings(POLYGONS_GEOMETRY_PROCESSES=processes,
+                               POLYGONS_OFFLOAD_VERTICES=LARGE_VERTICES // 2):
+            # Start the pool outside of the measured window
+            field.to_internal_value(large)
+            latencies = sorted(run(field, small, large))
+        p99 = latencies[int(len(latencies) * 0.99)]
+        rows.append([name, len(latencies),
+                     '%.2f' % (statistics.median(latencies) * 1000),
+                     '%.2f' % (p99 * 1000),
+                     '%.2f' % (latencies[-1] * 1000)])
+    geometry_executor.shutdown()
+    print_table(['large payloads', 'small requests', 'p50 ms', 'p99 ms',
+                 'max ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
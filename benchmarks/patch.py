@@ -0,0 +1,67 @@
+"""
+Compare renaming a polygon by rewriting its whole row with the targeted
+UPDATE of DetailView.patch.
+
+The whole-row update reads the polygon with its geometry, as loading the
+model did, and writes every column back, which rewrites the geometry and
+its TOAST chunks. The targeted update only locks the row, reads _updated
+and the stored bbox, and writes name and _updated.
+
+It seeds one polygon per size, so run it only against a disposable
+PostGIS database (migrate it first with manage.py migrateschema):
+    python -m benchmarks.patch
+"""
+import datetime
+from geoalchemy2.shape import from_shape
+from sqlalchemy import delete, insert, select, update
+from .common import best_of, make_polygon, print_table, setup_django
+
+NAME = 'patch benchmark'
+VERTICES = [10, 1000, 100000]
+
+
+def main():
+    setup_django()
+    from polygons.measures import measure
+    from polygons.models import SRID, GisPolygon, engine
+    from polygons.updates import lock_query, update_statements
+
+    table = GisPolygon.__table__
+    rows = []
+    try:
+        for vertices in VERTICES:
+            polygon = make_polygon(vertices)
+            with engine.begin() as connection:
+                polygon_id = connection.execute(
+                    insert(table).values(
+                        name=NAME, geom=from_shape(polygon, srid=SRID),
+                        _updated=datetime.datetime.now(),
+                        **measure(polygon)).returning(table.c.id)).scalar()
+
+            def whole_row():
+                with engine.begin() as connection:
+                    row = connection.execute(select(table).where(
+                        table.c.id == polygon_id).with_for_update()).first()
+                    values = dict(row._mapping, name=NAME,
+                                  _updated=datetime.datetime.now())
+                    connection.execute(update(table).where(
+                        table.c.id == polygon_id).values(values))
+
+            def targeted():
+                with engine.begin() as connection:
+                    connection.execute(lock_query(polygon_id)).first()
+                    for statement in update_statements(polygon_id, {
+                            'name': NAME,
+                            '_updated': datetime.datetime.now()}):
+                        connection.execute(statement)
+
+            rows.append([vertices, '%.2f' % (best_of(whole_row) * 1000),
+                         '%.2f' % (best_of(targeted) * 1000)])
+    finally:
+        with engine.begin() as connection:
+            connection.execute(delete(table).where(table.c.name == NAME))
+    print_table(['vertices', 'whole row ms', 'targeted ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Compare props filters answered by PostgreSQL through the GIN index on
+gis_polygon.props with fetching every row and filtering in Python.
+
+Seeds ROWS polygons with props, so run it only against a disposable PostGIS
+database (create the indexes first with manage.py migrateschema):
+    python -m benchmarks.props_filter
+"""
+import json
+from sqlalchemy import select, text
+from .common import best_of, print_table, setup_django
+
+ROWS = 1000000
+NAME = 'props filter benchmark'
+CASES = [
+    ('owner', {'owner': 'owner-7'}, None),
+    ('owner + class_id', {'owner': 'owner-7'}, [1, 2]),
+    ('nested', {'address': {'city': 'city-3'}}, None),
+    ('owner + kind', {'owner': 'owner-7', 'kind': 'lake'}, None),
+]
+
+SEED = """
+INSERT INTO gis_polygon (name, class_id, props, geom)
+SELECT :name, i % 10,
+       jsonb_build_object('owner', 'owner-' || i % 1000,
+                          'kind', (ARRAY['lake', 'field', 'forest'])[i % 3 + 1],
+                          'address', jsonb_build_object('city',
+                                                        'city-' || i % 100)),
+       ST_Expand(ST_SetSRID(ST_MakePoint(random() * 360 - 180,
+                                         random() * 170 - 85),
+                            4326), 0.01)
+FROM generate_series(1, :rows) AS i
+"""
+
+
+def contains(props, document):
+    if not isinstance(props, dict):
+        return False
+    for key, value in document.items():
+        if isinstance(value, dict):
+            if not contains(props.get(key), value):
+                return False
+        elif props.get(key) != value:
+            return False
+    return True
+
+
+def main():
+    setup_django()
+    from polygons.filters import class_filter, props_filter
+    from polygons.models import GisPolygon, engine
+    from polygons.views import PAGE_SIZE
+
+    with engine.begin() as connection:
+        connection.execute(text(SEED), {'name': NAME, 'rows': ROWS})
+        connection.execute(text('ANALYZE gis_polygon'))
+    rows = []
+    try:
+        with engine.connect() as connection:
+            for name, document, class_ids in CASES:
+                params = {'props': json.dumps(document)}
+                if class_ids:
+                    params['class_id'] = ','.join(map(str, class_ids))
+                conditions = [props_filter(params)]
+                if class_ids:
+                    conditions.append(class_filter(params))
+                query = select(GisPolygon.id).where(*conditions).order_by(
+                    GisPolygon.id).limit(PAGE_SIZE)
+
+                def indexed():
+                    return connection.execute(query).all()
+
+                def fetch_all():
+                    result = connection.execute(select(
+                        GisPolygon.id, GisPolygon.class_id, GisPolygon.props))
+                    matches = [row.id for row in result
+                               if contains(row.props, document) and
+                               (not class_ids or row.class_id in class_ids)]
+                    return sorted(matches)[:PAGE_SIZE]
+
+                assert [row.id for row in indexed()] == fetch_all()
+                rows.append([name,
+                             '%.1f' % (best_of(indexed) * 1000),
+                             '%.1f' % (best_of(fetch_all, repeat=2) * 1000)])
+    finally:
+        with engine.begin() as connection:
+            connection.execute(
+                text('DELETE FROM gis_polygon WHERE name = :name'),
+                {'name': NAME})
+    print_table(['filter', 'GIN index ms', 'fetch all ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Compare DetailView.get latency when rows are read as GisPolygon entities
+and geometries encoded by shapely in Python, and when PostGIS encodes
+(WKT as WKB for shapely to write) and reprojects them.
+
+Run from the project root against a disposable PostGIS database:
+    python -m benchmarks.read_path
+"""
+from .common import best_of, make_polygon, print_table, setup_django
+
+VERTEX_COUNTS = [1000, 10000, 100000]
+CASES = [
+    ('json', 'epsg:4326'),
+    ('geojson', 'epsg:4326'),
+    ('json', 'epsg:32644'),
+]
+
+
+def main():
+    setup_django()
+    from django.test import Client, override_settings
+    from django.urls import reverse
+    from polygons.models import GisPolygon, Session
+
+    client = Client()
+    rows = []
+    for vertices in VERTEX_COUNTS:
+        response = client.post(
+            reverse('polygons:index'), content_type='application/json',
+            data={'name': 'read path benchmark',
+                  'geom': {'polygon': make_polygon(vertices, holes=2).wkt}})
+        assert response.status_code == 201, response.content
+        url = reverse('polygons:detail',
+                      kwargs={'polygon_id': response.json()['id']})
+        for geometry_format, crs in CASES:
+            params = {'format': geometry_format, 'crs': crs}
+            timings = []
+            for encode, reproject in ((False, False), (True, False),
+                                      (True, True)):
+                if reproject and crs == 'epsg:4326':
+                    # Nothing to reproject, same path as db encode
+                    timings.append('-')
+                    continue
+                with override_settings(POLYGONS_ENCODE_IN_DB=encode,
+                                       POLYGONS_REPROJECT_IN_DB=reproject,
+                                       POLYGONS_RESPONSE_CACHE=False):
+                    timing = best_of(lambda: client.get(url, params))
+                timings.append('%.2f' % (timing * 1000))
+            rows.append([vertices, geometry_format, crs] + timings)
+    with Session() as session:
+        with session.begin():
+            session.query(GisPolygon).filter_by(
+                name='read path benchmark').delete()
+    print_table(['vertices', 'format', 'crs', 'python ms', 'db encode ms',
+                 'db reproject ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
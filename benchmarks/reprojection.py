@@ -0,0 +1,33 @@
+"""
+Compare shapely.ops.transform with the vectorized reprojection path.
+
+Run from the project root:
+    python -m benchmarks.reprojection
+"""
+from shapely.ops import transform
+from polygons.crs import TransformerRegistry, reproject
+from .common import best_of, make_polygon, print_table
+
+VERTEX_COUNTS = [100, 1000, 10000, 100000]
+
+
+def main():
+    transformer = TransformerRegistry().get('EPSG:4326', 'EPSG:32644')
+    rows = []
+    for vertices in VERTEX_COUNTS:
+        polygon = make_polygon(vertices, holes=2)
+        number = max(1, 10000 // vertices)
+        per_vertex = best_of(
+            lambda: transform(transformer.transform, polygon), number=number)
+        vectorized = best_of(
+            lambda: reproject(polygon, transformer), number=number)
+        rows.append([vertices,
+                     '%.3f' % (per_vertex * 1000),
+                     '%.3f' % (vectorized * 1000),
+                     '%.1fx' % (per_vertex / vectorized)])
+    print_table(['vertices', 'ops.transform ms', 'reproject ms', 'speedup'],
+                rows)
+
+
+if __name__ == '__main__':
+    main()
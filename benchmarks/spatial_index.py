@@ -0,0 +1,71 @@
+"""
+Compare a bbox search served by the GiST index on gis_polygon.geom with a
+sequential scan.
+
+Seeds ROWS small random polygons, so run it only against a disposable
+PostGIS database (create the index first with manage.py migrateschema):
+    python -m benchmarks.spatial_index
+"""
+import json
+from sqlalchemy import text
+from .common import print_table, setup_django
+
+ROWS = 1000000
+NAME = 'spatial index benchmark'
+BBOXES = [0.1, 1, 10]
+
+SEED = """
+INSERT INTO gis_polygon (name, geom)
+SELECT :name, ST_Expand(ST_SetSRID(ST_MakePoint(random() * 360 - 180,
+                                                random() * 170 - 85),
+                                   4326), 0.01)
+FROM generate_series(1, :rows)
+"""
+
+QUERY = """
+EXPLAIN (ANALYZE, FORMAT JSON)
+SELECT id FROM gis_polygon
+WHERE ST_Intersects(geom, ST_MakeEnvelope(0, 0, :size, :size, 4326))
+"""
+
+
+def explain(connection, size):
+    plan = connection.execute(text(QUERY), {'size': size}).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    node = plan[0]['Plan']
+    while node['Node Type'] not in ('Seq Scan', 'Index Scan',
+                                    'Bitmap Heap Scan') and 'Plans' in node:
+        node = node['Plans'][0]
+    return node['Node Type'], plan[0]['Execution Time']
+
+
+def main():
+    setup_django()
+    from polygons.models import engine
+
+    with engine.begin() as connection:
+        connection.execute(text(SEED), {'name': NAME, 'rows': ROWS})
+        connection.execute(text('ANALYZE gis_polygon'))
+    rows = []
+    try:
+        with engine.begin() as connection:
+            for size in BBOXES:
+                indexed = explain(connection, size)
+                connection.execute(text('SET enable_indexscan = off'))
+                connection.execute(text('SET enable_bitmapscan = off'))
+                sequential = explain(connection, size)
+                connection.execute(text('RESET enable_indexscan'))
+                connection.execute(text('RESET enable_bitmapscan'))
+                rows.append([size, indexed[0], '%.1f' % indexed[1],
+                             sequential[0], '%.1f' % sequential[1]])
+    finally:
+        with engine.begin() as connection:
+            connection.execute(
+                text('DELETE FROM gis_polygon WHERE name = :name'),
+                {'name': NAME})
+    print_table(['bbox deg', 'default plan', 'ms', 'without index', 'ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,9 @@
+from geoalchemy2.shape import from_shape
+from polygons.models import SRID, GisPolygon
+
+
+def bench_repr(benchmark, polygon):
+    gis_polygon = GisPolygon(id=1, class_id=1, name='Lake',
+                             props={'owner': 'Ann'},
+                             geom=from_shape(polygon, srid=SRID))
+    benchmark(repr, gis_polygon)
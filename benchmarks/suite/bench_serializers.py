@@ -0,0 +1,31 @@
+import pytest
+from geoalchemy2.shape import from_shape
+from polygons.crs import reproject, transformers
+from polygons.models import SRID
+from polygons.serializers import GeometryField
+
+CRS_LIST = ['EPSG:4326', 'EPSG:32644']
+FORMATS = ['wkt', 'wkb', 'geojson']
+
+
+def field(**context):
+    geometry_field = GeometryField()
+    geometry_field._context = context
+    return geometry_field
+
+
+@pytest.mark.parametrize('crs', CRS_LIST)
+def bench_to_internal_value(benchmark, polygon, crs):
+    if crs != GeometryField.DB_CRS:
+        polygon = reproject(polygon, transformers.get(
+            GeometryField.DB_CRS, crs))
+    data = {'polygon': polygon.wkt, 'crs': crs}
+    benchmark(field().to_internal_value, data)
+
+
+@pytest.mark.parametrize('geometry_format', FORMATS)
+@pytest.mark.parametrize('crs', CRS_LIST)
+def bench_to_representation(benchmark, polygon, crs, geometry_format):
+    value = from_shape(polygon, srid=SRID)
+    benchmark(field(crs=crs, geometry_format=geometry_format)
+              .to_representation, value)
@@ -0,0 +1,31 @@
+"""
+End-to-end requests through Django's test client, the URL resolver,
+middleware and the views, against the local PostGIS database.
+"""
+import pytest
+from django.urls import reverse
+from .conftest import NAME
+
+pytestmark = pytest.mark.db
+
+
+def bench_index_get(benchmark, client, stored_polygon):
+    url = reverse('polygons:index')
+    benchmark(client.get, url, {'limit': 100})
+
+
+def bench_index_post(benchmark, client, database, polygon):
+    url = reverse('polygons:index')
+    data = {'name': NAME, 'geom': {'polygon': polygon.wkt}}
+    response = benchmark(client.post, url, content_type='application/json',
+                         data=data)
+    assert response.status_code == 201
+
+
+@pytest.mark.parametrize('geometry_format', ['json', 'wkb', 'geojson'])
+@pytest.mark.parametrize('crs', ['epsg:4326', 'epsg:32644'])
+def bench_detail_get(benchmark, client, stored_polygon, crs, geometry_format):
+    url = reverse('polygons:detail', kwargs={'polygon_id': stored_polygon})
+    response = benchmark(client.get, url,
+                         {'crs': crs, 'format': geometry_format})
+    assert response.status_code == 200
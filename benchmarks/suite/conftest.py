@@ -0,0 +1,66 @@
+"""
+Fixtures of the pytest-benchmark suite, see benchmarks/suite/pytest.ini.
+
+Geometry work runs inline and response caches are off, so every round
+measures the code path itself. Benchmarks marked with `db` need the local
+PostGIS database polygons.models connects to and are skipped without it.
+"""
+import pytest
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment
+from ..common import make_polygon, setup_django
+
+setup_django()
+setup_test_environment()
+
+VERTEX_COUNTS = [10, 100, 1000, 10000, 100000]
+NAME = 'benchmark suite'
+
+
+@pytest.fixture(scope='session', autouse=True)
+def bench_settings():
+    with override_settings(POLYGONS_GEOMETRY_PROCESSES=0,
+                           POLYGONS_RESPONSE_CACHE=False,
+                           POLYGONS_TILE_CACHE_DIR=None):
+        yield
+
+
+@pytest.fixture(scope='session', params=VERTEX_COUNTS,
+                ids=['%dv' % vertices for vertices in VERTEX_COUNTS])
+def polygon(request):
+    """
+    Star-shaped polygon with two holes and about `vertices` vertices.
+    """
+    return make_polygon(request.param, holes=2)
+
+
+@pytest.fixture(scope='session')
+def database():
+    from sqlalchemy import exc
+    from polygons.models import GisPolygon, Session, engine
+    try:
+        engine.connect().close()
+    except exc.OperationalError as e:
+        pytest.skip('needs a local PostGIS database: %s' % e.orig)
+    yield
+    with Session() as session:
+        with session.begin():
+            session.query(GisPolygon).filter_by(name=NAME).delete()
+
+
+@pytest.fixture(scope='session')
+def client():
+    return Client()
+
+
+@pytest.fixture(scope='session')
+def stored_polygon(database, client, polygon):
+    """
+    Id of `polygon` stored through IndexView.
+    """
+    from django.urls import reverse
+    response = client.post(
+        reverse('polygons:index'), content_type='application/json',
+        data={'name': NAME, 'geom': {'polygon': polygon.wkt}})
+    assert response.status_code == 201, response.content
+    return response.json()['id']
@@ -0,0 +1,44 @@
+"""
+Cost of each check of polygons.validation, in the order GeometryField runs
+them, next to WKT parsing.
+
+GEOS validity is near linear for real boundaries, but make_polygon's
+stars are a worst case for it: the bounding box of every spike overlaps
+those of thousands of others. Both shapes are measured.
+
+Run from the project root:
+    python -m benchmarks.validation
+"""
+import shapely
+import shapely.wkt
+from shapely.geometry import Point
+from .common import best_of, make_polygon, print_table, setup_django
+
+VERTEX_COUNTS = [100, 10000, 100000]
+
+
+def main():
+    setup_django()
+    from polygons.validation import check_payload, check_polygon
+
+    rows = []
+    for vertices in VERTEX_COUNTS:
+        shapes = [('star', make_polygon(vertices, holes=2)),
+                  ('circle', Point(81, 20).buffer(
+                      0.1, quad_segs=max(1, vertices // 4)))]
+        number = max(1, 10000 // vertices)
+        for shape, polygon in shapes:
+            wkt = polygon.wkt
+            timings = [
+                best_of(lambda: check_payload(wkt), number=number),
+                best_of(lambda: shapely.wkt.loads(wkt), number=number),
+                best_of(lambda: check_polygon(polygon, 'reject'),
+                        number=number)]
+            rows.append([vertices, shape] + ['%.3f' % (timing * 1000)
+                                             for timing in timings])
+    print_table(['vertices', 'shape', 'size + vertices ms', 'parse ms',
+                 'type + validity ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
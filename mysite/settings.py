@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -51,6 +52,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'polygons.middleware.TimingMiddleware',
+    'polygons.middleware.db_session_middleware',
 ]
 
 ROOT_URLCONF = 'mysite.urls'
@@ -84,6 +87,26 @@ DATABASES = {
     }
 }
 
+# PostGIS database of the polygons app, accessed through SQLAlchemy.
+# Size the pool so that workers * (POOL_SIZE + MAX_OVERFLOW) stays below
+# max_connections of the server. STATEMENT_TIMEOUT is in milliseconds.
+POLYGONS_DATABASE = {
+    'URL': 'postgresql://postgres:%s@localhost:5432/%s' % (
+        os.environ.get('POSTGRES_PASS', ''),
+        os.environ.get('POSTGRES_DB', '').strip()),
+    'POOL_SIZE': int(os.environ.get('POLYGONS_POOL_SIZE', 5)),
+    'MAX_OVERFLOW': int(os.environ.get('POLYGONS_MAX_OVERFLOW', 10)),
+    'POOL_TIMEOUT': 30,
+    'POOL_RECYCLE': 1800,
+    'POOL_PRE_PING': True,
+    'STATEMENT_TIMEOUT': 30000,
+}
+# Pool the asyncpg connections of the async views per event loop, with the
+# sizes above. mysite/asgi.py turns it on, since ASGI servers run one loop
+# per worker. Under WSGI async_to_sync runs every request on a new loop, so
+# sessions connect without a pool instead.
+POLYGONS_ASYNC_POOL = os.environ.get('POLYGONS_ASYNC_POOL', '') == '1'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -127,3 +150,99 @@ STATIC_URL = '/static/'
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Polygons
+
+# Build pyproj transformers for every pair of supported CRS at startup
+# instead of on the first request that needs them.
+POLYGONS_PREWARM_TRANSFORMERS = True
+
+# Let PostGIS encode geometries of read requests as GeoJSON and WKB
+# (ST_AsGeoJSON, ST_AsBinary) and, with POLYGONS_REPROJECT_IN_DB, reproject
+# them with ST_Transform instead of pyproj. For WKT PostGIS sends WKB and
+# shapely writes the text, so WKT responses stay byte for byte the same.
+POLYGONS_ENCODE_IN_DB = True
+POLYGONS_REPROJECT_IN_DB = False
+
+# Cache rendered DetailView responses in a bounded in-process LRU and,
+# when POLYGONS_CACHE_SHARED_ALIAS names one of CACHES, in a shared cache.
+POLYGONS_RESPONSE_CACHE = True
+POLYGONS_CACHE_MAX_ENTRIES = 1024
+POLYGONS_CACHE_MAX_BYTES = 64 * 1024 * 1024
+POLYGONS_CACHE_LOCAL_TTL = 10
+POLYGONS_CACHE_SHARED_ALIAS = None
+POLYGONS_CACHE_SHARED_TTL = 300
+
+# Parse, reproject and encode geometries with at least
+# POLYGONS_OFFLOAD_VERTICES vertices in a pool of
+# POLYGONS_GEOMETRY_PROCESSES processes instead of the request thread.
+POLYGONS_GEOMETRY_PROCESSES = 2
+POLYGONS_OFFLOAD_VERTICES = 50000
+
+# Tolerances of the simplified levels of detail (?lod=1, 2, ...) stored on
+# write, in degrees of EPSG:4326. Run manage.py buildlods after a change.
+POLYGONS_LOD_TOLERANCES = [0.0001, 0.001, 0.01]
+
+# Vector tiles of /polygons/tiles/<z>/<x>/<y>.mvt are cached on disk under
+# POLYGONS_TILE_CACHE_DIR (None disables the cache) and carry the
+# POLYGONS_TILE_PROPS keys of props as attributes.
+POLYGONS_TILE_CACHE_DIR = BASE_DIR / 'tile_cache'
+POLYGONS_TILE_MAX_ZOOM = 22
+POLYGONS_TILE_PROPS = []
+
+# How long statements of manage.py migrateschema wait for a table lock
+# before failing, instead of queueing every query behind them.
+POLYGONS_MIGRATION_LOCK_TIMEOUT = '5s'
+# Rows per transaction when a migration copies a column
+POLYGONS_MIGRATION_BATCH_SIZE = 10000
+
+# Per-stage timings of every request are sent in a Server-Timing header and
+# served by /polygons/metrics/prometheus/. With POLYGONS_PROFILE, or for
+# requests carrying POLYGONS_PROFILE_HEADER, sync requests are sampled and
+# the stacks of those slower than POLYGONS_PROFILE_SLOW_MS (or asking with
+# the header) are written to POLYGONS_PROFILE_DIR as flamegraph input.
+# Sampling costs a thread and a file per request, so the header (e.g.
+# 'X-Polygons-Profile') is off by default and, outside DEBUG, only honored
+# when its value is POLYGONS_PROFILE_SECRET.
+POLYGONS_SERVER_TIMING = True
+POLYGONS_PROFILE = False
+POLYGONS_PROFILE_HEADER = None
+POLYGONS_PROFILE_SECRET = os.environ.get('POLYGONS_PROFILE_SECRET')
+POLYGONS_PROFILE_DIR = BASE_DIR / 'profiles'
+POLYGONS_PROFILE_INTERVAL = 0.005
+POLYGONS_PROFILE_SLOW_MS = 500
+
+# /polygons/changes/ holds back changes younger than POLYGONS_CHANGES_LAG
+# seconds, so writes still in flight commit first. Streams poll every
+# POLYGONS_CHANGES_POLL_INTERVAL seconds for at most
+# POLYGONS_CHANGES_STREAM_TIMEOUT. manage.py prunetombstones deletes
+# tombstones older than POLYGONS_TOMBSTONE_RETENTION_DAYS.
+POLYGONS_CHANGES_LAG = 5
+POLYGONS_CHANGES_POLL_INTERVAL = 5
+POLYGONS_CHANGES_STREAM_TIMEOUT = 300
+POLYGONS_TOMBSTONE_RETENTION_DAYS = 30
+
+# Largest number of ids /polygons/batch/ reads in one request.
+POLYGONS_BATCH_MAX_IDS = 1000
+
+# Incoming polygons larger than POLYGONS_MAX_WKT_BYTES of WKT or
+# POLYGONS_MAX_VERTICES vertices are rejected before parsing. Invalid ones
+# are handled as POLYGONS_INVALID_GEOMETRY says: 'reject', 'repair' with
+# make_valid, or 'warn' and store them as they are.
+POLYGONS_MAX_WKT_BYTES = 64 * 1024 * 1024
+POLYGONS_MAX_VERTICES = 1000000
+POLYGONS_INVALID_GEOMETRY = 'reject'
+# Django rejects request bodies above 2.5 MB by default, before the views
+# see them. Leave room for a polygon of POLYGONS_MAX_WKT_BYTES and its JSON,
+# which also fits bulk batches of thousands of polygons.
+DATA_UPLOAD_MAX_MEMORY_SIZE = int(os.environ.get(
+    'POLYGONS_MAX_BODY_BYTES', POLYGONS_MAX_WKT_BYTES + 1024 * 1024))
+
+# /polygons/aggregate/ answers from a rollup by class_id and grid cell at
+# POLYGONS_ROLLUP_RESOLUTION (cells of 360 / 2**resolution degrees), which
+# manage.py refreshrollup refreshes, unless polygons were written since a
+# refresh older than POLYGONS_ROLLUP_MAX_AGE seconds. Run manage.py
+# refreshrollup --rebuild after changing the resolution.
+POLYGONS_ROLLUP_RESOLUTION = 8
+POLYGONS_ROLLUP_MAX_AGE = 60
@@ -0,0 +1,322 @@
+"""
+Counts, areas and extents of polygons grouped by class_id, grid cell or
+k-means cluster, computed in PostGIS, see AggregateView.
+
+Polygons with a geometry count in the region and the grid cell holding
+their centroid, so each is counted once. Cells of the grid at resolution r
+are squares of 360 / 2**r degrees of EPSG:4326, numbered from (-180, -90).
+Stored measures are used when present, see polygons.measures, and
+computed from the geometry otherwise.
+
+The gis_polygon_rollup materialized view keeps the aggregates by class_id
+and cell at POLYGONS_ROLLUP_RESOLUTION, refreshed by manage.py
+refreshrollup. It answers requests grouping by class_id and coarser cells,
+filtered on class_id and a bbox on its cells at most, as long as no
+polygon was written since its refresh or it is younger than
+POLYGONS_ROLLUP_MAX_AGE seconds.
+"""
+import datetime
+from django.conf import settings
+from geoalchemy2 import Geography
+from rest_framework import serializers
+from sqlalchemy import (
+    Float, Integer, and_, cast, column, exists, func, select, table, text)
+from sqlalchemy.dialects import postgresql
+from .filters import (
+    class_ids, db_geometry, measure_filter, props_filter, query_geometry)
+from .models import SRID, GisPolygon, GisPolygonTombstone
+from .serializers import GeometryField
+
+GROUPS = ('class_id', 'grid', 'cluster')
+MAX_RESOLUTION = 24
+DEFAULT_CLUSTERS = 8
+MAX_CLUSTERS = 100
+ROLLUP_VIEW = 'gis_polygon_rollup'
+ROLLUP_TABLE = 'polygons_rollup_refresh'
+EXTENT = ('min_x', 'min_y', 'max_x', 'max_y')
+
+rollup = table(ROLLUP_VIEW, column('class_id', Integer),
+               column('cell_x', Integer), column('cell_y', Integer),
+               column('count', Integer), column('area', Float),
+               *(column(name, Float) for name in EXTENT))
+
+CENTROID_X = func.coalesce(GisPolygon.centroid_x,
+                           func.ST_X(func.ST_Centroid(GisPolygon.geom)))
+CENTROID_Y = func.coalesce(GisPolygon.centroid_y,
+                           func.ST_Y(func.ST_Centroid(GisPolygon.geom)))
+AREA = func.coalesce(GisPolygon.area, func.ST_Area(
+    cast(GisPolygon.geom, Geography(srid=SRID))))
+BOUNDS = {'min_x': func.ST_XMin(GisPolygon.geom),
+          'min_y': func.ST_YMin(GisPolygon.geom),
+          'max_x': func.ST_XMax(GisPolygon.geom),
+          'max_y': func.ST_YMax(GisPolygon.geom)}
+
+
+def rollup_resolution():
+    return getattr(settings, 'POLYGONS_ROLLUP_RESOLUTION', 8)
+
+
+def cell_size(resolution):
+    return 360.0 / 2 ** resolution
+
+
+def cell_index(value, offset, resolution):
+    return cast(func.floor((value + offset) / cell_size(resolution)),
+                Integer)
+
+
+def cell_bbox(cell_x, cell_y, resolution):
+    size = cell_size(resolution)
+    return [-180 + cell_x * size, -90 + cell_y * size,
+            -180 + (cell_x + 1) * size, -90 + (cell_y + 1) * size]
+
+
+def int_param(params, name, default, minimum, maximum):
+    try:
+        value = int(params.get(name, default))
+    except ValueError:
+        raise serializers.ValidationError('%s must be an integer' % name)
+    if not minimum <= value <= maximum:
+        raise serializers.ValidationError(
+            '%s must be between %d and %d' % (name, minimum, maximum))
+    return value
+
+
+def aggregate_params(params):
+    """
+    Groups, grid resolution and number of clusters of an aggregation.
+    """
+    groups = params.get('group_by', 'class_id').split(',')
+    if not groups or any(group not in GROUPS for group in groups):
+        raise serializers.ValidationError(
+            'group_by must be a comma separated list of %s' %
+            ', '.join(GROUPS))
+    if 'grid' in groups and 'cluster' in groups:
+        raise serializers.ValidationError(
+            'group_by takes either grid or cluster')
+    resolution = int_param(params, 'resolution', rollup_resolution(), 0,
+                           MAX_RESOLUTION)
+    clusters = int_param(params, 'clusters', DEFAULT_CLUSTERS, 1,
+                         MAX_CLUSTERS)
+    return groups, resolution, clusters
+
+
+def region_bbox(params):
+    """
+    `bbox` in the database CRS, None when the region is not a bbox in it.
+    """
+    crs = params.get('crs', GeometryField.DB_CRS).upper()
+    if 'bbox' not in params or crs != GeometryField.DB_CRS:
+        return None
+    return query_geometry(params).bounds
+
+
+def region_filter(params):
+    """
+    Polygons whose centroid lies in the `bbox` or `geom` region, the GiST
+    index on geom ruling out the others first. None without a region.
+    """
+    if 'bbox' not in params and 'geom' not in params:
+        return None
+    region = query_geometry(params)
+    candidates = GisPolygon.geom.intersects(db_geometry(region))
+    bbox = region_bbox(params)
+    if bbox is not None:
+        # Half-open like the cells, so rollup and database agree on edges
+        min_x, min_y, max_x, max_y = bbox
+        return and_(candidates, CENTROID_X >= min_x, CENTROID_X < max_x,
+                    CENTROID_Y >= min_y, CENTROID_Y < max_y)
+    return and_(candidates, func.ST_Intersects(
+        func.ST_SetSRID(func.ST_MakePoint(CENTROID_X, CENTROID_Y), SRID),
+        db_geometry(region)))
+
+
+def database_query(groups, resolution, clusters, conditions):
+    """
+    Aggregation query over gis_polygon.
+    """
+    columns = [GisPolygon.class_id, CENTROID_X.label('x'),
+               CENTROID_Y.label('y'), AREA.label('area'),
+               *(func.coalesce(getattr(GisPolygon, name),
+                               BOUNDS[name]).label(name)
+                 for name in EXTENT)]
+    if 'cluster' in groups:
+        columns.append(func.ST_ClusterKMeans(GisPolygon.geom, clusters).over(
+            partition_by=GisPolygon.class_id if 'class_id' in groups
+            else None).label('cluster'))
+    polygons = select(*columns).where(
+        GisPolygon.geom.isnot(None), *conditions).subquery()
+    keys = []
+    if 'class_id' in groups:
+        keys.append(polygons.c.class_id)
+    if 'grid' in groups:
+        keys.append(cell_index(polygons.c.x, 180, resolution).label(
+            'cell_x'))
+        keys.append(cell_index(polygons.c.y, 90, resolution).label(
+            'cell_y'))
+    if 'cluster' in groups:
+        keys.append(polygons.c.cluster)
+    return select(
+        *keys, func.count().label('count'),
+        func.sum(polygons.c.area).label('area'),
+        func.min(polygons.c.min_x).label('min_x'),
+        func.min(polygons.c.min_y).label('min_y'),
+        func.max(polygons.c.max_x).label('max_x'),
+        func.max(polygons.c.max_y).label('max_y')).group_by(
+        *keys).order_by(*keys)
+
+
+def rollup_query(groups, resolution, ids, bbox):
+    """
+    Aggregation query over gis_polygon_rollup, None when it cannot answer:
+    cells finer than the rollup, clusters or a bbox off its cells.
+    """
+    base = rollup_resolution()
+    if 'cluster' in groups or resolution > base:
+        return None
+    conditions = []
+    if ids is not None:
+        conditions.append(rollup.c.class_id.in_(ids))
+    if bbox is not None:
+        size = cell_size(base)
+        cells = [(value - origin) / size for value, origin in
+                 zip(bbox, (-180, -90, -180, -90))]
+        if any(abs(cell - round(cell)) > 1e-9 for cell in cells):
+            return None
+        min_x, min_y, max_x, max_y = map(round, cells)
+        conditions.extend([rollup.c.cell_x >= min_x, rollup.c.cell_x < max_x,
+                           rollup.c.cell_y >= min_y, rollup.c.cell_y < max_y])
+    keys = []
+    if 'class_id' in groups:
+        keys.append(rollup.c.class_id)
+    if 'grid' in groups:
+        factor = float(2 ** (base - resolution))
+        keys.append(cast(func.floor(rollup.c.cell_x / factor),
+                         Integer).label('cell_x'))
+        keys.append(cast(func.floor(rollup.c.cell_y / factor),
+                         Integer).label('cell_y'))
+    return select(
+        *keys, cast(func.sum(rollup.c.count), Integer).label('count'),
+        func.sum(rollup.c.area).label('area'),
+        func.min(rollup.c.min_x).label('min_x'),
+        func.min(rollup.c.min_y).label('min_y'),
+        func.max(rollup.c.max_x).label('max_x'),
+        func.max(rollup.c.max_y).label('max_y')).where(
+        *conditions).group_by(*keys).order_by(*keys)
+
+
+def rollup_fresh(session):
+    """
+    Whether gis_polygon_rollup is populated at POLYGONS_ROLLUP_RESOLUTION
+    and recent enough to answer, see the module docstring.
+    """
+    state = session.execute(text(
+        'SELECT resolution, refreshed FROM %s' % ROLLUP_TABLE)).first()
+    if state is None or state.resolution != rollup_resolution():
+        return False
+    max_age = datetime.timedelta(
+        seconds=getattr(settings, 'POLYGONS_ROLLUP_MAX_AGE', 60))
+    if state.refreshed > datetime.datetime.utcnow() - max_age:
+        return True
+    return not session.query(
+        exists().where(GisPolygon._updated > state.refreshed)).scalar() and \
+        not session.query(exists().where(
+            GisPolygonTombstone._deleted > state.refreshed)).scalar()
+
+
+def serialize_groups(rows, groups, resolution):
+    results = []
+    for row in rows:
+        if 'grid' in groups and row.cell_x is None:
+            # Empty polygons have no centroid
+            continue
+        result = {}
+        if 'class_id' in groups:
+            result['class_id'] = row.class_id
+        if 'grid' in groups:
+            result['cell'] = [row.cell_x, row.cell_y]
+            result['cell_bbox'] = cell_bbox(row.cell_x, row.cell_y,
+                                            resolution)
+        if 'cluster' in groups:
+            result['cluster'] = row.cluster
+        result['count'] = row.count
+        result['area'] = row.area
+        result['bbox'] = None if row.min_x is None else [
+            row.min_x, row.min_y, row.max_x, row.max_y]
+        results.append(result)
+    return results
+
+
+def aggregate(session, params):
+    """
+    Aggregates of the polygons matching the query parameters, and whether
+    they come from the `rollup` or the `database`.
+    """
+    groups, resolution, clusters = aggregate_params(params)
+    region = region_filter(params)
+    ids = class_ids(params)
+    other = [condition for condition in (props_filter(params),
+                                         measure_filter(params))
+             if condition is not None]
+    bbox = region_bbox(params)
+    query = None
+    if not other and 'geom' not in params and params.get('rollup') != '0' \
+            and ('bbox' not in params or bbox is not None):
+        query = rollup_query(groups, resolution, ids, bbox)
+        if query is not None and not rollup_fresh(session):
+            query = None
+    source = 'rollup'
+    if query is None:
+        source = 'database'
+        conditions = other + [condition for condition in (
+            region, None if ids is None else GisPolygon.class_id.in_(ids))
+            if condition is not None]
+        query = database_query(groups, resolution, clusters, conditions)
+    rows = session.execute(query).all()
+    return serialize_groups(rows, groups, resolution), source
+
+
+def create_rollup(connection):
+    """
+    (Re)create gis_polygon_rollup at POLYGONS_ROLLUP_RESOLUTION, empty
+    until refresh_rollup(). Its comment holds the resolution.
+    """
+    resolution = rollup_resolution()
+    definition = database_query(['class_id', 'grid'], resolution, None,
+                                []).order_by(None)
+    connection.execute(text('DROP MATERIALIZED VIEW IF EXISTS %s' %
+                            ROLLUP_VIEW))
+    connection.execute(text('DELETE FROM %s' % ROLLUP_TABLE))
+    connection.execute(text('CREATE MATERIALIZED VIEW %s AS %s WITH NO DATA'
+                            % (ROLLUP_VIEW, definition.compile(
+                                dialect=postgresql.dialect(),
+                                compile_kwargs={'literal_binds': True}))))
+    connection.execute(text("COMMENT ON MATERIALIZED VIEW %s IS '%d'" % (
+        ROLLUP_VIEW, resolution)))
+    connection.execute(text(
+        'CREATE UNIQUE INDEX idx_%s ON %s (class_id, cell_x, cell_y)' % (
+            ROLLUP_VIEW, ROLLUP_VIEW)))
+
+
+def refresh_rollup(connection):
+    """
+    Refresh gis_polygon_rollup without blocking its readers once it has
+    data, and record when and at which resolution, which is returned.
+    """
+    # Writes still in flight when the refresh starts may be missing from it
+    refreshed = datetime.datetime.utcnow() - datetime.timedelta(
+        seconds=getattr(settings, 'POLYGONS_CHANGES_LAG', 5))
+    populated = connection.execute(text(
+        'SELECT ispopulated FROM pg_matviews WHERE matviewname = :name'),
+        {'name': ROLLUP_VIEW}).scalar()
+    connection.execute(text('REFRESH MATERIALIZED VIEW %s%s' % (
+        'CONCURRENTLY ' if populated else '', ROLLUP_VIEW)))
+    resolution = int(connection.execute(text(
+        "SELECT obj_description(CAST(:name AS regclass), 'pg_class')"),
+        {'name': ROLLUP_VIEW}).scalar())
+    connection.execute(text('DELETE FROM %s' % ROLLUP_TABLE))
+    connection.execute(text(
+        'INSERT INTO %s (resolution, refreshed) VALUES (:resolution, '
+        ':refreshed)' % ROLLUP_TABLE),
+        {'resolution': resolution, 'refreshed': refreshed})
+    return resolution
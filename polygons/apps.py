@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class PolygonsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'polygons'
+
+    def ready(self):
+        if getattr(settings, 'POLYGONS_PREWARM_TRANSFORMERS', False):
+            from .crs import transformers
+            from .serializers import GeometryField
+            transformers.prewarm(GeometryField.SUPPORTED_CRS)
@@ -0,0 +1,178 @@
+"""
+Async versions of the index, detail and write endpoints for ASGI servers.
+
+Queries go through SQLAlchemy's AsyncEngine on asyncpg and serializer work
+(WKT parsing, reprojection, encoding) runs in a thread pool, so the event
+loop only waits on I/O.
+"""
+import asyncio
+import functools
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.shortcuts import render
+from rest_framework import serializers, status
+from rest_framework.renderers import JSONRenderer
+from sqlalchemy import select
+from .changes import tombstone
+from .encoding import db_encoded_geometry, polygon_columns
+from .lod import lod_geometry, lod_params, with_lod
+from .models import AsyncSession, GisPolygon
+from .serializers import GisPolygonSerializer
+from .tiles import invalidate_bounds, invalidate_tiles
+from .updates import bounds, expected_versions, lock_query, update_statements
+from .views import DEFAULT_CRS, invalidate_cached_responses, page_params
+
+executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'POLYGONS_ASYNC_CPU_WORKERS', None) or
+    os.cpu_count(), thread_name_prefix='polygons-cpu')
+
+
+async def run_cpu(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor, functools.partial(func, *args))
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(JSONRenderer().render(data), status=status_code,
+                        content_type='application/json')
+
+
+def parse_json(request):
+    try:
+        return json.loads(request.body)
+    except ValueError as e:
+        raise serializers.ValidationError('JSON parse error - %s' % e)
+
+
+def validate(serializer):
+    if not serializer.is_valid():
+        raise serializers.ValidationError(serializer.errors)
+    return serializer.save()
+
+
+async def index(request):
+    if request.method == 'GET':
+        return await list_polygons(request)
+    if request.method == 'POST':
+        return await create_polygon(request)
+    return HttpResponse(status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+async def detail(request, polygon_id):
+    if request.method == 'GET':
+        return await get_polygon(request, polygon_id)
+    if request.method == 'PATCH':
+        return await update_polygon(request, polygon_id)
+    if request.method == 'DELETE':
+        return await delete_polygon(request, polygon_id)
+    return HttpResponse(status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+# Async views cannot be wrapped in csrf_exempt before Django 5.0
+index.csrf_exempt = True
+detail.csrf_exempt = True
+
+
+async def list_polygons(request):
+    try:
+        after, limit = page_params(request.GET)
+    except serializers.ValidationError as e:
+        return json_response(e.detail, status.HTTP_400_BAD_REQUEST)
+    query = select(GisPolygon.id, GisPolygon.name).where(
+        GisPolygon.id > after).order_by(GisPolygon.id).limit(limit + 1)
+    async with AsyncSession() as session:
+        polygon_list = (await session.execute(query)).all()
+    next_after = None
+    if len(polygon_list) > limit:
+        polygon_list = polygon_list[:limit]
+        next_after = polygon_list[-1].id
+    context = {'polygon_list': polygon_list,
+               'next_after': next_after,
+               'limit': limit}
+    return render(request, 'polygons/index.html', context)
+
+
+async def create_polygon(request):
+    try:
+        serializer = GisPolygonSerializer(data=parse_json(request))
+        polygon = await run_cpu(validate, serializer)
+    except serializers.ValidationError as e:
+        return json_response(e.detail, status.HTTP_400_BAD_REQUEST)
+    async with AsyncSession() as session:
+        async with session.begin():
+            session.add(polygon)
+    await sync_to_async(invalidate_tiles)([polygon.geom])
+    return json_response({'id': polygon.id}, status.HTTP_201_CREATED)
+
+
+async def get_polygon(request, polygon_id):
+    crs = request.GET.get('crs', DEFAULT_CRS)
+    try:
+        lod, tolerance = lod_params(request.GET)
+    except serializers.ValidationError as e:
+        return json_response(e.detail, status.HTTP_400_BAD_REQUEST)
+    geom = lod_geometry(lod, tolerance)
+    encoded_geometry = db_encoded_geometry('wkt', crs, geom)
+    query = with_lod(select(*polygon_columns(encoded_geometry, geom)), lod)
+    query = query.where(GisPolygon.id == polygon_id)
+    async with AsyncSession() as session:
+        row = (await session.execute(query)).first()
+    if row is None:
+        return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+    polygon = row[0] if encoded_geometry is None and geom is None else row
+    context = {'crs': crs, 'encoded_in_db': encoded_geometry is not None}
+    serializer = GisPolygonSerializer(polygon, context=context)
+    try:
+        data = await run_cpu(lambda: serializer.data)
+    except serializers.ValidationError as e:
+        return json_response(e.detail, status.HTTP_400_BAD_REQUEST)
+    return json_response(data)
+
+
+def update_values(serializer):
+    if not serializer.is_valid():
+        raise serializers.ValidationError(serializer.errors)
+    return serializer.update_values(serializer.validated_data)
+
+
+async def update_polygon(request, polygon_id):
+    try:
+        data = parse_json(request)
+        serializer = GisPolygonSerializer(data=data, partial=True)
+        values = await run_cpu(update_values, serializer)
+        versions = expected_versions(
+            polygon_id, request.headers.get('If-Match'), data)
+    except serializers.ValidationError as e:
+        return json_response(e.detail, status.HTTP_400_BAD_REQUEST)
+    async with AsyncSession() as session:
+        async with session.begin():
+            row = (await session.execute(lock_query(polygon_id))).first()
+            if row is None:
+                return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+            if any(row._updated not in version for version in versions):
+                return HttpResponse(
+                    status=status.HTTP_412_PRECONDITION_FAILED)
+            for statement in update_statements(polygon_id, values):
+                await session.execute(statement)
+    await sync_to_async(invalidate_cached_responses)(polygon_id)
+    await sync_to_async(invalidate_bounds)([tuple(row)[1:], bounds(values)])
+    return json_response({'_updated': serializer.fields['_updated']
+                          .to_representation(values['_updated'])})
+
+
+async def delete_polygon(request, polygon_id):
+    async with AsyncSession() as session:
+        async with session.begin():
+            polygon = await session.get(GisPolygon, polygon_id)
+            if polygon is None:
+                return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+            await session.delete(polygon)
+            await session.execute(tombstone(polygon_id))
+    await sync_to_async(invalidate_cached_responses)(polygon_id)
+    await sync_to_async(invalidate_tiles)([polygon.geom])
+    return HttpResponse(status=status.HTTP_200_OK)
@@ -0,0 +1,196 @@
+"""
+Cache of rendered DetailView responses keyed by (polygon_id, crs, format,
+lod).
+
+The first tier is a bounded LRU in the process, the second one is an
+optional Django cache shared between processes. Local entries expire after
+POLYGONS_CACHE_LOCAL_TTL seconds, because writes handled by other processes
+only invalidate the shared tier and their own local tier.
+
+Invalidation bumps a per-polygon generation, and responses are stored only
+when the generation taken before reading the row is still current, so a
+read racing a write cannot put the old response back.
+"""
+import collections
+import itertools
+import threading
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import caches
+from . import metrics
+
+
+CachedResponse = collections.namedtuple(
+    'CachedResponse', ['etag', 'content', 'content_type'])
+
+
+def make_etag(polygon_id, updated, crs, geometry_format, lod=0):
+    version = updated.isoformat() if updated else ''
+    return '"%d-%s-%s-%s-%s"' % (polygon_id, version, crs, geometry_format,
+                                 lod)
+
+
+class LRUCache:
+    def __init__(self, max_entries, max_bytes, ttl):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    self._pop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value):
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self.bytes += len(value.content)
+            while self._entries and (len(self._entries) > self.max_entries or
+                                     self.bytes > self.max_bytes):
+                self._pop(next(iter(self._entries)))
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def _pop(self, key):
+        _, value = self._entries.pop(key)
+        self.bytes -= len(value.content)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self.bytes,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+class ResponseCache:
+    def __init__(self):
+        self.local = LRUCache(
+            getattr(settings, 'POLYGONS_CACHE_MAX_ENTRIES', 1024),
+            getattr(settings, 'POLYGONS_CACHE_MAX_BYTES', 64 * 1024 * 1024),
+            getattr(settings, 'POLYGONS_CACHE_LOCAL_TTL', 10))
+        self._lock = threading.Lock()
+        self._generations = {}
+        self.shared_hits = 0
+        self.shared_misses = 0
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'POLYGONS_RESPONSE_CACHE', False)
+
+    @property
+    def shared(self):
+        alias = getattr(settings, 'POLYGONS_CACHE_SHARED_ALIAS', None)
+        return caches[alias] if alias else None
+
+    @staticmethod
+    def shared_key(key):
+        return 'polygons:detail:%d:%s:%s:%d' % key
+
+    @staticmethod
+    def generation_key(polygon_id):
+        return 'polygons:generation:%d' % polygon_id
+
+    def generation(self, polygon_id):
+        """
+        Token that changes whenever the polygon is invalidated, take it
+        before reading the row and pass it to set().
+        """
+        with self._lock:
+            local = self._generations.get(polygon_id, 0)
+        if self.shared is None:
+            return local, None
+        return local, self.shared.get(self.generation_key(polygon_id))
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        response = self.local.get(key)
+        if response is not None or self.shared is None:
+            return response
+        response = self.shared.get(self.shared_key(key))
+        with self._lock:
+            if response is None:
+                self.shared_misses += 1
+            else:
+                self.shared_hits += 1
+        if response is None:
+            return None
+        response = CachedResponse(*response)
+        self.local.set(key, response)
+        return response
+
+    def set(self, key, response, generation):
+        """
+        Store a response read at `generation`, unless the polygon has been
+        invalidated since.
+        """
+        if not self.enabled or self.generation(key[0]) != generation:
+            return
+        self.local.set(key, response)
+        if self.shared is not None:
+            timeout = getattr(settings, 'POLYGONS_CACHE_SHARED_TTL', 300)
+            self.shared.set(self.shared_key(key), tuple(response), timeout)
+        # Invalidated between the check and the writes
+        if self.generation(key[0]) != generation:
+            self.local.delete_many([key])
+            if self.shared is not None:
+                self.shared.delete(self.shared_key(key))
+
+    def invalidate(self, polygon_id, crs_list, formats, levels):
+        """
+        Drop every cached representation of a polygon.
+        """
+        # Bump the generation first, so that responses read before now are
+        # not stored afterwards
+        with self._lock:
+            self._generations[polygon_id] = \
+                self._generations.get(polygon_id, 0) + 1
+        if self.shared is not None:
+            timeout = getattr(settings, 'POLYGONS_CACHE_SHARED_TTL', 300)
+            self.shared.set(self.generation_key(polygon_id),
+                            uuid.uuid4().hex, timeout)
+        keys = [(polygon_id, crs, geometry_format, lod)
+                for crs, geometry_format, lod
+                in itertools.product(crs_list, formats, levels)]
+        self.local.delete_many(keys)
+        if self.shared is not None:
+            self.shared.delete_many([self.shared_key(key) for key in keys])
+
+    def clear(self):
+        self.local.clear()
+
+    def stats(self):
+        with self._lock:
+            shared = {'hits': self.shared_hits, 'misses': self.shared_misses}
+        stats = {'local': self.local.stats(), 'shared': shared}
+        for tier in stats.values():
+            lookups = tier['hits'] + tier['misses']
+            tier['hit_ratio'] = tier['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+response_cache = ResponseCache()
+metrics.register('response_cache', response_cache.stats)
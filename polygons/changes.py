@@ -0,0 +1,160 @@
+"""
+Feed of the polygons created, updated or deleted after a cursor.
+
+Changes are ordered by (_updated, id) of gis_polygon, which
+idx_gis_polygon_updated serves, merged with the tombstones that deletes
+leave in gis_polygon_tombstone. A cursor is `<timestamp>,<id>` of the last
+change a consumer has seen, a bare timestamp starts at that time.
+
+_updated comes from the clock of the app server preparing the write, so a
+slow transaction may commit a change older than one already served.
+Changes younger than POLYGONS_CHANGES_LAG seconds are held back until such
+transactions have committed.
+"""
+import datetime
+import heapq
+import itertools
+from django.conf import settings
+from rest_framework import serializers
+from sqlalchemy import desc, text, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from .encoding import polygon_query
+from .models import GisPolygon, GisPolygonTombstone
+from .serializers import GisPolygonSerializer
+
+PRUNE_TABLE = 'polygons_tombstone_prune'
+
+
+def parse_cursor(value):
+    """
+    (timestamp, id) of a cursor, or None to start from the first change.
+    """
+    if not value:
+        return None
+    timestamp, _, polygon_id = value.partition(',')
+    try:
+        timestamp = datetime.datetime.fromisoformat(timestamp)
+        polygon_id = int(polygon_id or 0)
+    except ValueError:
+        raise serializers.ValidationError(
+            'cursor must be an ISO 8601 timestamp, optionally followed by '
+            ',<id>')
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(
+            datetime.timezone.utc).replace(tzinfo=None)
+    return timestamp, polygon_id
+
+
+def change_key(row):
+    if isinstance(row, GisPolygonTombstone):
+        return row._deleted, row.id
+    return row._updated, row.id
+
+
+def format_cursor(row):
+    timestamp, polygon_id = change_key(row)
+    return '%s,%d' % (timestamp.isoformat(), polygon_id)
+
+
+def retention():
+    return datetime.timedelta(
+        days=getattr(settings, 'POLYGONS_TOMBSTONE_RETENTION_DAYS', 30))
+
+
+def pruned(session):
+    """
+    (timestamp, id) of the newest tombstone pruned, None when none was.
+    """
+    row = session.execute(text(
+        'SELECT _deleted, id FROM %s' % PRUNE_TABLE)).first()
+    return tuple(row) if row else None
+
+
+def prune(session):
+    """
+    Delete tombstones older than POLYGONS_TOMBSTONE_RETENTION_DAYS and
+    record the newest of them. Returns how many were deleted.
+    """
+    horizon = datetime.datetime.utcnow() - retention()
+    newest = session.query(
+        GisPolygonTombstone._deleted, GisPolygonTombstone.id).filter(
+        GisPolygonTombstone._deleted < horizon).order_by(
+        desc(GisPolygonTombstone._deleted),
+        desc(GisPolygonTombstone.id)).first()
+    if newest is None:
+        return 0
+    previous = pruned(session)
+    if previous is not None:
+        newest = max(tuple(newest), previous)
+    count = session.query(GisPolygonTombstone).filter(
+        GisPolygonTombstone._deleted < horizon).delete(
+        synchronize_session=False)
+    session.execute(text('DELETE FROM %s' % PRUNE_TABLE))
+    session.execute(text(
+        'INSERT INTO %s (_deleted, id) VALUES (:deleted, :id)' %
+        PRUNE_TABLE), {'deleted': newest[0], 'id': newest[1]})
+    return count
+
+
+def expired(session, cursor):
+    """
+    Whether tombstones after a cursor were pruned, see the prunetombstones
+    command. Such consumers have to sync from scratch.
+    """
+    if cursor is None:
+        return False
+    newest = pruned(session)
+    return newest is not None and cursor < newest
+
+
+def changes(session, cursor, limit, encoded_geometry=None):
+    """
+    Up to `limit` polygon rows and tombstones after a cursor, oldest first,
+    and whether more changes follow.
+    """
+    horizon = datetime.datetime.utcnow() - datetime.timedelta(
+        seconds=getattr(settings, 'POLYGONS_CHANGES_LAG', 5))
+    polygons = polygon_query(session, encoded_geometry).filter(
+        GisPolygon._updated < horizon)
+    tombstones = session.query(GisPolygonTombstone).filter(
+        GisPolygonTombstone._deleted < horizon)
+    if cursor is not None:
+        polygons = polygons.filter(
+            tuple_(GisPolygon._updated, GisPolygon.id) > cursor)
+        tombstones = tombstones.filter(tuple_(
+            GisPolygonTombstone._deleted, GisPolygonTombstone.id) > cursor)
+    polygons = polygons.order_by(
+        GisPolygon._updated, GisPolygon.id).limit(limit + 1)
+    tombstones = tombstones.order_by(
+        GisPolygonTombstone._deleted, GisPolygonTombstone.id).limit(limit + 1)
+    rows = list(itertools.islice(heapq.merge(
+        polygons.all(), tombstones.all(), key=change_key), limit + 1))
+    return rows[:limit], len(rows) > limit
+
+
+def serialize_changes(rows, context):
+    """
+    Feed entries of rows from changes(), `upsert` with the polygon
+    serialized with `context` or `delete` with its id.
+    """
+    entries = []
+    for row in rows:
+        if isinstance(row, GisPolygonTombstone):
+            entries.append({'op': 'delete', 'cursor': format_cursor(row),
+                            'id': row.id})
+        else:
+            entries.append({
+                'op': 'upsert', 'cursor': format_cursor(row),
+                'polygon': GisPolygonSerializer(row, context=context).data})
+    return entries
+
+
+def tombstone(polygon_id):
+    """
+    Statement recording the deletion of a polygon, to run in the
+    transaction deleting it.
+    """
+    statement = insert(GisPolygonTombstone.__table__).values(
+        id=polygon_id, _deleted=datetime.datetime.utcnow())
+    return statement.on_conflict_do_update(
+        index_elements=['id'], set_={'_deleted': statement.excluded._deleted})
@@ -0,0 +1,101 @@
+import itertools
+import threading
+import numpy as np
+import pyproj
+from shapely.geometry import Polygon
+from shapely.ops import transform
+from . import metrics
+from .timing import stage
+
+
+class TransformerRegistry:
+    """
+    Process-wide cache of pyproj transformers keyed by (from_crs, to_crs).
+
+    Building a transformer means a lookup in the PROJ database, so it is done
+    once per CRS pair and reused afterwards. pyproj transformers are safe to
+    share between threads since pyproj 3.1, only construction is guarded.
+    """
+
+    def __init__(self):
+        self._transformers = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, from_crs, to_crs):
+        key = (from_crs.upper(), to_crs.upper())
+        with self._lock:
+            transformer = self._transformers.get(key)
+            if transformer is not None:
+                self.hits += 1
+                return transformer
+            self.misses += 1
+            transformer = pyproj.Transformer.from_crs(
+                pyproj.CRS(key[0]), pyproj.CRS(key[1]), always_xy=True)
+            self._transformers[key] = transformer
+            return transformer
+
+    def prewarm(self, crs_list):
+        for from_crs, to_crs in itertools.permutations(crs_list, 2):
+            self.get(from_crs, to_crs)
+
+    def clear(self):
+        with self._lock:
+            self._transformers.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._transformers),
+                    'hits': self.hits,
+                    'misses': self.misses}
+
+
+transformers = TransformerRegistry()
+metrics.register('transformers', transformers.stats)
+
+
+def reproject(polygon, transformer):
+    """
+    Reproject a polygon with one batched transform call.
+    """
+    return reproject_many([polygon], transformer)[0]
+
+
+def reproject_many(polygons, transformer):
+    """
+    Reproject polygons with one batched transform call.
+
+    Coordinates of all rings are stacked into a single NumPy array, so no
+    Python tuple is created per vertex. Empty, 3D and non-polygon geometries
+    fall back to shapely.ops.transform.
+    """
+    result = []
+    rings = []
+    ring_counts = []
+    for polygon in polygons:
+        if polygon.is_empty or polygon.geom_type != 'Polygon' or \
+                polygon.has_z:
+            with stage('transform'):
+                result.append(transform(transformer.transform, polygon))
+            ring_counts.append(0)
+            continue
+        result.append(None)
+        rings.append(np.asarray(polygon.exterior.coords))
+        rings.extend(np.asarray(ring.coords) for ring in polygon.interiors)
+        ring_counts.append(1 + len(polygon.interiors))
+    if not rings:
+        return result
+    coords = np.concatenate(rings)
+    with stage('transform'):
+        coords = np.column_stack(transformer.transform(*coords.T))
+    offsets = np.cumsum([len(ring) for ring in rings])[:-1]
+    rings = iter(np.split(coords, offsets))
+    for i, count in enumerate(ring_counts):
+        if count:
+            shell = next(rings)
+            holes = [next(rings) for _ in range(count - 1)]
+            result[i] = Polygon(shell, holes)
+    return result
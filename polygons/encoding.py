@@ -0,0 +1,62 @@
+"""
+Read path that lets PostGIS encode (and optionally reproject) geometries.
+
+Rows are fetched as plain column tuples with `geom` already encoded as
+GeoJSON or WKB, so Python never builds GisPolygon entities. WKT is fetched
+as WKB and written by shapely, ST_AsText spaces and rounds numbers its own
+way and responses must not change with POLYGONS_ENCODE_IN_DB.
+"""
+from django.conf import settings
+from sqlalchemy import func
+from .measures import COLUMNS as MEASURES
+from .models import GisPolygon
+from .serializers import GeometryField
+
+
+def srid(crs):
+    return int(crs.split(':')[1])
+
+
+def db_encoded_geometry(geometry_format, crs, geom=None):
+    """
+    SQL expression of `geom` (GisPolygon.geom by default) encoded as
+    `geometry_format` in `crs`.
+
+    WKT is selected as WKB for GeometryField to write. Returns None when
+    the geometry has to go through Python instead, i.e. when
+    POLYGONS_ENCODE_IN_DB is off, or reprojection is needed and
+    POLYGONS_REPROJECT_IN_DB is off.
+    """
+    if not getattr(settings, 'POLYGONS_ENCODE_IN_DB', False):
+        return None
+    crs = crs.upper()
+    if geom is None:
+        geom = GisPolygon.geom
+    if crs != GeometryField.DB_CRS:
+        if crs not in GeometryField.SUPPORTED_CRS or \
+                not getattr(settings, 'POLYGONS_REPROJECT_IN_DB', False):
+            return None
+        geom = func.ST_Transform(geom, srid(crs))
+    if geometry_format == 'geojson':
+        return func.ST_AsGeoJSON(geom)
+    return func.ST_AsBinary(geom)
+
+
+def polygon_columns(encoded_geometry, geom=None):
+    """
+    Polygon columns with `geom` replaced by `encoded_geometry`, or by the
+    `geom` expression when it is None. The GisPolygon entity when both
+    are None.
+    """
+    if encoded_geometry is None:
+        if geom is None:
+            return [GisPolygon]
+        encoded_geometry = geom
+    return [GisPolygon._created, GisPolygon._updated, GisPolygon.id,
+            GisPolygon.class_id, GisPolygon.name, GisPolygon.props,
+            encoded_geometry.label('geom'),
+            *(getattr(GisPolygon, name) for name in MEASURES)]
+
+
+def polygon_query(session, encoded_geometry, geom=None):
+    return session.query(*polygon_columns(encoded_geometry, geom))
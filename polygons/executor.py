@@ -0,0 +1,198 @@
+"""
+Process pool for geometry work on large payloads.
+
+Parsing, reprojecting and encoding a polygon with hundreds of thousands of
+vertices holds the GIL long enough to stall every other request of the
+worker. Payloads with at least POLYGONS_OFFLOAD_VERTICES vertices are sent
+to a pool of POLYGONS_GEOMETRY_PROCESSES processes instead; smaller ones
+stay on the request thread.
+
+Payloads and results travel through shared memory blocks, only their names
+and sizes are pickled. The functions running in the pool do not touch
+Django, so workers can be started with forkserver.
+"""
+import collections
+import json
+import multiprocessing
+import pickle
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+import shapely.wkb
+import shapely.wkt
+from django.conf import settings
+from shapely.geometry import mapping
+from . import metrics
+from .crs import reproject, transformers
+from .measures import measure
+from .validation import check_polygon
+
+
+Parsed = collections.namedtuple('Parsed', ['wkb', 'tiers', 'measures'])
+
+
+def parse(payload, from_crs, to_crs, policy=None, tolerances=()):
+    """
+    Pickled Parsed of a WKT polygon in `from_crs`: its WKB in `to_crs`,
+    checked with check_polygon() under `policy` unless it is None, the
+    WKB of its simplification with each of `tolerances`, and its measures.
+    """
+    polygon = shapely.wkt.loads(payload.decode())
+    if policy is not None:
+        polygon = check_polygon(polygon, policy)
+    if from_crs != to_crs:
+        polygon = reproject(polygon, transformers.get(from_crs, to_crs))
+    tiers = [polygon.simplify(tolerance, preserve_topology=True).wkb
+             for tolerance in tolerances]
+    return pickle.dumps(Parsed(polygon.wkb, tiers, measure(polygon)))
+
+
+def encode(payload, from_crs, to_crs, geometry_format):
+    """
+    WKB polygon in `from_crs` encoded as `geometry_format` in `to_crs`.
+    """
+    polygon = shapely.wkb.loads(payload)
+    if from_crs != to_crs:
+        polygon = reproject(polygon, transformers.get(from_crs, to_crs))
+    if geometry_format == 'wkt':
+        return str(polygon).encode()
+    if geometry_format == 'geojson':
+        return json.dumps(mapping(polygon)).encode()
+    return polygon.wkb
+
+
+OPERATIONS = {'parse': parse, 'encode': encode}
+
+
+def run_operation(operation, name, size, args):
+    """
+    Run an operation on the payload in shared memory block `name`.
+
+    Returns the name and size of the block holding the result, which the
+    caller unlinks, and when the work started and finished.
+    """
+    started = time.monotonic()
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        payload = bytes(block.buf[:size])
+    finally:
+        block.close()
+    result = OPERATIONS[operation](payload, *args)
+    block = shared_memory.SharedMemory(create=True, size=max(len(result), 1))
+    try:
+        block.buf[:len(result)] = result
+    finally:
+        block.close()
+    return block.name, len(result), started, time.monotonic()
+
+
+class GeometryExecutor:
+    def __init__(self):
+        self._pool = None
+        self._lock = threading.Lock()
+        self.inline = 0
+        self.offloaded = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.queue_seconds_total = 0.0
+        self.queue_seconds_max = 0.0
+        self.run_seconds_total = 0.0
+        self.run_seconds_max = 0.0
+
+    @property
+    def processes(self):
+        return getattr(settings, 'POLYGONS_GEOMETRY_PROCESSES', 0)
+
+    def offloads(self, vertices):
+        """
+        Whether a payload of about `vertices` vertices goes to the pool.
+        Counts the decision for the inline/offloaded stats.
+        """
+        threshold = getattr(settings, 'POLYGONS_OFFLOAD_VERTICES', None)
+        offload = bool(self.processes and threshold) and vertices >= threshold
+        with self._lock:
+            if offload:
+                self.offloaded += 1
+            else:
+                self.inline += 1
+        return offload
+
+    def parse(self, wkt, from_crs, to_crs, policy=None, tolerances=()):
+        return pickle.loads(self._run(
+            'parse', wkt.encode(), from_crs, to_crs, policy, tolerances))
+
+    def encode(self, wkb, from_crs, to_crs, geometry_format):
+        result = self._run('encode', wkb, from_crs, to_crs, geometry_format)
+        if geometry_format in ('wkt', 'geojson'):
+            return result.decode()
+        return result
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # Workers must share the parent's tracker, or they would
+                # unlink result blocks before the parent has read them.
+                resource_tracker.ensure_running()
+                context = multiprocessing.get_context(getattr(
+                    settings, 'POLYGONS_GEOMETRY_START_METHOD', 'forkserver'))
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.processes, mp_context=context)
+            return self._pool
+
+    def _run(self, operation, payload, *args):
+        pool = self._get_pool()
+        block = shared_memory.SharedMemory(
+            create=True, size=max(len(payload), 1))
+        try:
+            block.buf[:len(payload)] = payload
+            submitted = time.monotonic()
+            with self._lock:
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                future = pool.submit(run_operation, operation, block.name,
+                                     len(payload), args)
+                name, size, started, finished = future.result()
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+        finally:
+            block.close()
+            block.unlink()
+        self._record(started - submitted, finished - started)
+        block = shared_memory.SharedMemory(name=name)
+        try:
+            return bytes(block.buf[:size])
+        finally:
+            block.close()
+            block.unlink()
+
+    def _record(self, queued, ran):
+        with self._lock:
+            self.queue_seconds_total += queued
+            self.queue_seconds_max = max(self.queue_seconds_max, queued)
+            self.run_seconds_total += ran
+            self.run_seconds_max = max(self.run_seconds_max, ran)
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def stats(self):
+        with self._lock:
+            return {'processes': self.processes,
+                    'inline': self.inline,
+                    'offloaded': self.offloaded,
+                    'in_flight': self.in_flight,
+                    'max_in_flight': self.max_in_flight,
+                    'queue_seconds_total': self.queue_seconds_total,
+                    'queue_seconds_max': self.queue_seconds_max,
+                    'run_seconds_total': self.run_seconds_total,
+                    'run_seconds_max': self.run_seconds_max}
+
+
+geometry_executor = GeometryExecutor()
+metrics.register('geometry_executor', geometry_executor.stats)
@@ -0,0 +1,203 @@
+"""
+Export of the polygon table to NDJSON, GeoPackage or GeoParquet.
+
+Rows are read from a server-side cursor in batches of EXPORT_BATCH, the
+geometries of a batch are reprojected with one transform call and written
+before the next batch is fetched, so memory does not grow with the table.
+GeoPackage needs fiona and GeoParquet needs pyarrow.
+"""
+import json
+import pyproj
+import shapely.wkb
+from rest_framework import serializers
+from rest_framework.utils.encoders import JSONEncoder
+from shapely.geometry import mapping
+from sqlalchemy import and_, func, select
+from .crs import reproject_many, transformers
+from .filters import filter_conditions
+from .models import GisPolygon, Session
+from .serializers import GeometryField
+
+try:
+    import fiona
+except ImportError:
+    fiona = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+EXPORT_BATCH = 5000
+PROPERTIES = ('class_id', 'name', 'props', '_created', '_updated')
+
+
+def export_params(params):
+    """
+    Output CRS and the condition of the `class_id`, `bbox`, `geom` and
+    `props` filters, None to export every polygon. bbox and geom are in
+    the output CRS.
+    """
+    crs = params.get('crs', GeometryField.DB_CRS).upper()
+    if crs not in GeometryField.SUPPORTED_CRS:
+        raise serializers.ValidationError('Incorrect CRS value %s' % crs)
+    params = params.copy()
+    params['crs'] = crs
+    conditions = filter_conditions(params)
+    return crs, and_(*conditions) if conditions else None
+
+
+def batches(session, condition, batch_size=EXPORT_BATCH):
+    """
+    Lists of rows with the geometry as WKB, fetched from a server-side
+    cursor in id order.
+    """
+    query = select(
+        GisPolygon.id, *(getattr(GisPolygon, name) for name in PROPERTIES),
+        func.ST_AsBinary(GisPolygon.geom).label('geom')).order_by(
+        GisPolygon.id).execution_options(stream_results=True)
+    if condition is not None:
+        query = query.where(condition)
+    yield from session.execute(query).partitions(batch_size)
+
+
+def geometries(rows, crs):
+    """
+    Shapely geometries of a batch of rows in `crs`, None for rows without.
+    """
+    polygons = [shapely.wkb.loads(bytes(row.geom))
+                for row in rows if row.geom is not None]
+    if crs != GeometryField.DB_CRS:
+        polygons = reproject_many(
+            polygons, transformers.get(GeometryField.DB_CRS, crs))
+    polygons = iter(polygons)
+    return [None if row.geom is None else next(polygons) for row in rows]
+
+
+def to_json(props):
+    return None if props is None else json.dumps(props)
+
+
+class NDJSONWriter:
+    """
+    One GeoJSON Feature per line.
+    """
+    content_type = 'application/x-ndjson'
+
+    def __init__(self, path, crs):
+        self.file = open(path, 'wb')
+
+    @staticmethod
+    def encode(rows, polygons):
+        return ''.join(json.dumps({
+            'type': 'Feature', 'id': row.id,
+            'geometry': mapping(polygon) if polygon is not None else None,
+            'properties': {name: getattr(row, name) for name in PROPERTIES},
+        }, cls=JSONEncoder) + '\n' for row, polygon in zip(rows, polygons)
+        ).encode()
+
+    def write(self, rows, polygons):
+        self.file.write(self.encode(rows, polygons))
+
+    def close(self):
+        self.file.close()
+
+
+class GeoPackageWriter:
+    """
+    A `polygons` layer written by GDAL through fiona, one transaction per
+    batch.
+    """
+    content_type = 'application/geopackage+sqlite3'
+    schema = {'geometry': 'Polygon',
+              'properties': {'id': 'int', 'class_id': 'int', 'name': 'str',
+                             'props': 'str', '_created': 'datetime',
+                             '_updated': 'datetime'}}
+
+    def __init__(self, path, crs):
+        self.collection = fiona.open(
+            path, 'w', driver='GPKG', layer='polygons', schema=self.schema,
+            crs_wkt=pyproj.CRS(crs).to_wkt())
+
+    def write(self, rows, polygons):
+        records = []
+        for row, polygon in zip(rows, polygons):
+            properties = {name: getattr(row, name) for name in PROPERTIES}
+            properties['id'] = row.id
+            properties['props'] = to_json(row.props)
+            records.append({
+                'geometry': mapping(polygon) if polygon is not None else None,
+                'properties': properties})
+        self.collection.writerecords(records)
+
+    def close(self):
+        self.collection.close()
+
+
+class GeoParquetWriter:
+    """
+    GeoParquet 1.0 with the geometry as WKB, one row group per batch.
+    """
+    content_type = 'application/vnd.apache.parquet'
+
+    def __init__(self, path, crs):
+        self.schema = pyarrow.schema([
+            ('id', pyarrow.int64()), ('class_id', pyarrow.int64()),
+            ('name', pyarrow.string()), ('props', pyarrow.string()),
+            ('_created', pyarrow.timestamp('us')),
+            ('_updated', pyarrow.timestamp('us')),
+            ('geometry', pyarrow.binary())],
+            metadata={'geo': json.dumps({
+                'version': '1.0.0', 'primary_column': 'geometry',
+                'columns': {'geometry': {
+                    'encoding': 'WKB', 'geometry_types': ['Polygon'],
+                    'crs': pyproj.CRS(crs).to_json_dict()}}})})
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def write(self, rows, polygons):
+        columns = {name: [getattr(row, name) for row in rows]
+                   for name in ('id',) + PROPERTIES}
+        columns['props'] = [to_json(props) for props in columns['props']]
+        columns['geometry'] = [polygon.wkb if polygon is not None else None
+                               for polygon in polygons]
+        self.writer.write_table(
+            pyarrow.Table.from_pydict(columns, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {'ndjson': NDJSONWriter}
+if fiona is not None:
+    WRITERS['gpkg'] = GeoPackageWriter
+if pyarrow is not None:
+    WRITERS['parquet'] = GeoParquetWriter
+
+
+def stream_ndjson(crs, condition):
+    """
+    NDJSON of the export, batch by batch.
+    """
+    with Session() as session:
+        with session.begin():
+            for rows in batches(session, condition):
+                yield NDJSONWriter.encode(rows, geometries(rows, crs))
+
+
+def export(path, extension, crs, condition):
+    """
+    Write the polygons matching `condition` to `path` as one of WRITERS,
+    returns their number.
+    """
+    writer = WRITERS[extension](path, crs)
+    count = 0
+    try:
+        with Session() as session:
+            with session.begin():
+                for rows in batches(session, condition):
+                    writer.write(rows, geometries(rows, crs))
+                    count += len(rows)
+    finally:
+        writer.close()
+    return count
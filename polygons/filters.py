@@ -0,0 +1,192 @@
+import json
+import shapely.errors
+import shapely.wkt
+from rest_framework import serializers
+from shapely.geometry import box
+from sqlalchemy import and_, func
+from .crs import reproject, transformers
+from .models import SRID, GisPolygon
+from .serializers import GeometryField
+
+
+SPATIAL_PREDICATES = {
+    'intersects': func.ST_Intersects,
+    'contains': func.ST_Contains,
+    'within': func.ST_Within,
+    'dwithin': func.ST_DWithin,
+}
+
+
+def db_geometry(polygon):
+    """
+    SQL literal of a shapely geometry in the database CRS.
+    """
+    return func.ST_GeomFromText(polygon.wkt, SRID)
+
+
+def query_geometry(params):
+    """
+    Geometry given by the `bbox` (minx,miny,maxx,maxy) or `geom` (WKT)
+    query parameter in `crs`, reprojected to the database CRS.
+    """
+    crs = params.get('crs', GeometryField.DB_CRS).upper()
+    if crs not in GeometryField.SUPPORTED_CRS:
+        msg = 'Incorrect CRS value %s'
+        raise serializers.ValidationError(msg % params['crs'])
+    if 'bbox' in params:
+        try:
+            minx, miny, maxx, maxy = map(float, params['bbox'].split(','))
+        except ValueError:
+            raise serializers.ValidationError(
+                'bbox must be minx,miny,maxx,maxy')
+        geometry = box(minx, miny, maxx, maxy)
+    elif 'geom' in params:
+        try:
+            geometry = shapely.wkt.loads(params['geom'])
+        except shapely.errors.ShapelyError:
+            raise serializers.ValidationError('geom must be a WKT geometry')
+    else:
+        raise serializers.ValidationError('bbox or geom is required')
+    if crs != GeometryField.DB_CRS:
+        geometry = reproject(geometry, transformers.get(
+            crs, GeometryField.DB_CRS))
+    return geometry
+
+
+def spatial_filter(params):
+    """
+    Filter on GisPolygon.geom from query parameters.
+
+    `predicate` is one of SPATIAL_PREDICATES and tells how stored polygons
+    relate to the query geometry, e.g. `contains` matches polygons that
+    contain it. `dwithin` also needs `distance` in units of the database
+    CRS. All predicates are answered through the GiST index on geom.
+    """
+    predicate = params.get('predicate', 'intersects')
+    if predicate not in SPATIAL_PREDICATES:
+        msg = 'Unknown predicate %s, expected one of %s'
+        raise serializers.ValidationError(
+            msg % (predicate, ', '.join(SPATIAL_PREDICATES)))
+    target = db_geometry(query_geometry(params))
+    if predicate == 'dwithin':
+        try:
+            distance = float(params['distance'])
+        except (KeyError, ValueError):
+            raise serializers.ValidationError(
+                'distance is required for dwithin')
+        return func.ST_DWithin(GisPolygon.geom, target, distance)
+    return SPATIAL_PREDICATES[predicate](GisPolygon.geom, target)
+
+
+def props_filter(params):
+    """
+    Containment filter on GisPolygon.props answered through its GIN index.
+
+    `props` is a JSON object the stored props must contain, and every
+    `props.<key>=<value>` parameter adds a key to it, with dots in the key
+    for nested objects. Values are read as JSON when they parse, e.g. 1 or
+    true, and as strings otherwise.
+    """
+    document = {}
+    if 'props' in params:
+        try:
+            document = json.loads(params['props'])
+        except ValueError:
+            document = None
+        if not isinstance(document, dict):
+            raise serializers.ValidationError('props must be a JSON object')
+    for param, value in params.items():
+        if not param.startswith('props.'):
+            continue
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass
+        *path, key = param.split('.')[1:]
+        node = document
+        for name in path:
+            node = node.setdefault(name, {})
+            if not isinstance(node, dict):
+                raise serializers.ValidationError(
+                    'Conflicting props filters on %s' % name)
+        node[key] = value
+    if not document:
+        return None
+    return GisPolygon.props.contains(document)
+
+
+def class_ids(params):
+    """
+    Ids of `class_id`, a comma separated list of class ids, or None.
+    """
+    if 'class_id' not in params:
+        return None
+    try:
+        return [int(class_id) for class_id in params['class_id'].split(',')]
+    except ValueError:
+        raise serializers.ValidationError(
+            'class_id must be a comma separated list of integers')
+
+
+def class_filter(params):
+    """
+    Filter on `class_id`, a comma separated list of class ids.
+    """
+    ids = class_ids(params)
+    if ids is None:
+        return None
+    return GisPolygon.class_id.in_(ids)
+
+
+MEASURE_FILTERS = {'area': float, 'perimeter': float, 'vertex_count': int}
+
+
+def measure_filter(params):
+    """
+    Range filters on the stored measures, `min_<measure>` and
+    `max_<measure>` for area (m²), perimeter (m) and vertex_count,
+    answered through their indexes.
+    """
+    conditions = []
+    for name, convert in MEASURE_FILTERS.items():
+        column = getattr(GisPolygon, name)
+        for bound, compare in (('min', column.__ge__),
+                               ('max', column.__le__)):
+            param = '%s_%s' % (bound, name)
+            if param not in params:
+                continue
+            try:
+                conditions.append(compare(convert(params[param])))
+            except ValueError:
+                raise serializers.ValidationError(
+                    '%s must be a number' % param)
+    if not conditions:
+        return None
+    return and_(*conditions)
+
+
+def filter_conditions(params):
+    """
+    spatial_filter when `bbox` or `geom` is given, props_filter,
+    class_filter and measure_filter, leaving out the ones without
+    parameters.
+    """
+    conditions = []
+    if 'bbox' in params or 'geom' in params:
+        conditions.append(spatial_filter(params))
+    for condition in (props_filter(params), class_filter(params),
+                      measure_filter(params)):
+        if condition is not None:
+            conditions.append(condition)
+    return conditions
+
+
+def search_filter(params):
+    """
+    Conditions of SearchView, at least one of filter_conditions is required.
+    """
+    conditions = filter_conditions(params)
+    if not conditions:
+        raise serializers.ValidationError(
+            'bbox, geom, props, class_id or a measure range is required')
+    return and_(*conditions)
@@ -0,0 +1,336 @@
+"""
+Bulk import of polygons through COPY, see manage.py importpolygons.
+
+Items are read lazily from NDJSON, or from GeoJSON, Shapefile and
+GeoPackage through fiona, and handed in chunks to worker processes. Workers
+validate a chunk with GisPolygonSerializer, reprojecting it with one
+transform call like BulkView, compute the levels of detail and encode the
+rows in the binary COPY format with geometries as EWKB. The main process
+writes each chunk with one COPY per table, in a transaction that also
+advances the checkpoint of the source file, so an interrupted import
+resumes after the last committed chunk.
+"""
+import collections
+import datetime
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pyproj
+import shapely.errors
+import shapely.wkb
+from django.conf import settings
+from shapely.geometry import shape
+from sqlalchemy import text
+from sqlalchemy.sql.elements import Null
+from .lod import simplified_tiers
+from .measures import COLUMNS as MEASURES
+from .models import SRID, engine
+from .serializers import GeometryField, GisPolygonSerializer
+from .tiles import invalidate_bounds
+
+try:
+    import fiona
+except ImportError:
+    fiona = None
+
+CHUNK_SIZE = 5000
+NDJSON_EXTENSIONS = ('.ndjson', '.jsonl', '.geojsonl', '.geojsons')
+CHECKPOINT_TABLE = 'polygons_import_checkpoint'
+POLYGON_COLUMNS = ('id', '_created', '_updated', 'class_id', 'name', 'props',
+                   'geom') + MEASURES
+LOD_COLUMNS = ('polygon_id', 'level', 'geom')
+COPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)
+COPY_TRAILER = struct.pack('!h', -1)
+NULL = struct.pack('!i', -1)
+PG_EPOCH = datetime.datetime(2000, 1, 1)
+
+
+def source_crs(path):
+    """
+    CRS of an input file as 'EPSG:n', None when the file does not tell.
+    """
+    if path.endswith(NDJSON_EXTENSIONS) or fiona is None:
+        return None
+    with fiona.open(path) as collection:
+        if not collection.crs_wkt:
+            return None
+        epsg = pyproj.CRS(collection.crs_wkt).to_epsg()
+    return 'EPSG:%d' % epsg if epsg else None
+
+
+def read_items(path):
+    """
+    Items of an input file one by one. Malformed NDJSON lines are kept as
+    raw strings, so validation rejects them.
+    """
+    if path.endswith(NDJSON_EXTENSIONS):
+        with open(path, 'rb') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield line.decode(errors='replace')
+        return
+    if fiona is None:
+        raise ValueError('Reading %s needs fiona' % path)
+    with fiona.open(path) as collection:
+        for feature in collection:
+            if not isinstance(feature, dict):
+                feature = fiona.model.to_dict(feature)
+            yield feature
+
+
+def to_data(item, crs):
+    """
+    Serializer data of an item, either a GeoJSON Feature or a polygon as
+    BulkView takes it, with geometries in `crs` unless they tell theirs.
+
+    `name` and `class_id` of a Feature are read from its properties, its
+    props from a `props` property or else from the other properties.
+    """
+    if not isinstance(item, dict):
+        return item
+    if item.get('type') != 'Feature':
+        geom = item.get('geom')
+        if isinstance(geom, dict) and 'crs' not in geom:
+            item = dict(item, geom=dict(geom, crs=crs))
+        return item
+    properties = dict(item.get('properties') or {})
+    data = {name: properties.pop(name) for name in ('name', 'class_id')
+            if properties.get(name) is not None}
+    for name in ('id', '_created', '_updated'):
+        properties.pop(name, None)
+    props = properties.pop('props') if 'props' in properties else properties
+    if isinstance(props, str):
+        try:
+            props = json.loads(props)
+        except ValueError:
+            pass
+    if props:
+        data['props'] = props
+    if item.get('geometry'):
+        data['geom'] = {'polygon': shape(item['geometry']).wkt, 'crs': crs}
+    return data
+
+
+def copy_field(value):
+    if value is None:
+        return NULL
+    return struct.pack('!i', len(value)) + value
+
+
+def copy_int(value):
+    return NULL if value is None else struct.pack('!ii', 4, value)
+
+
+def copy_float(value):
+    return NULL if value is None else struct.pack('!id', 8, value)
+
+
+def copy_timestamp(value):
+    delta = value - PG_EPOCH
+    return struct.pack('!iq', 8, (delta.days * 86400 + delta.seconds) *
+                       1000000 + delta.microseconds)
+
+
+def copy_jsonb(value):
+    if value is None or isinstance(value, Null):
+        return NULL
+    return copy_field(b'\x01' + json.dumps(value).encode())
+
+
+def copy_geometry(polygon):
+    if polygon is None:
+        return NULL
+    return copy_field(shapely.wkb.dumps(polygon, srid=SRID))
+
+
+def prepare_chunk(items, crs):
+    """
+    Validate and encode a chunk of items.
+
+    Returns the rows as (index, fields, lods) where fields are the COPY
+    fields of gis_polygon after id and lods the (level, geometry field)
+    of gis_polygon_lod, the errors by index and the bounds of the chunk.
+    """
+    errors = {}
+    data = []
+    for index, item in enumerate(items):
+        try:
+            data.append((index, to_data(item, crs)))
+        except (AttributeError, TypeError, ValueError,
+                shapely.errors.ShapelyError) as e:
+            errors[index] = {'geom': [str(e)]}
+    serializer = GisPolygonSerializer(
+        data=[item for _, item in data], many=True,
+        context={'batch_reprojection': True})
+    valid, invalid = serializer.validate_items()
+    for position, detail in invalid.items():
+        errors[data[position][0]] = detail
+    polygons = {position: shapely.wkb.loads(bytes(validated_data['geom'].data))
+                for position, validated_data in valid
+                if validated_data.get('geom') is not None}
+    rows = []
+    bounds = []
+    created = serializer.create_rows(
+        validated_data for _, validated_data in valid)
+    for (position, _), row in zip(valid, created):
+        index = data[position][0]
+        polygon = polygons.get(position)
+        if polygon is not None and not polygon.is_empty:
+            bounds.append(polygon.bounds)
+        fields = b''.join([
+            copy_timestamp(row['_created']), copy_timestamp(row['_updated']),
+            copy_int(row['class_id']),
+            copy_field(row['name'].encode() if row['name'] is not None
+                       else None),
+            copy_jsonb(row['props']), copy_geometry(polygon),
+            *(copy_int(row[name]) if name == 'vertex_count'
+              else copy_float(row[name]) for name in MEASURES)])
+        lods = [(level, copy_geometry(shapely.wkb.loads(bytes(geom.data))))
+                for level, geom in simplified_tiers(row['geom'])]
+        rows.append((index, fields, lods))
+    if bounds:
+        bounds = (min(b[0] for b in bounds), min(b[1] for b in bounds),
+                  max(b[2] for b in bounds), max(b[3] for b in bounds))
+    return rows, errors, bounds or None
+
+
+def copy(cursor, table, columns, tuples):
+    payload = io.BytesIO(b''.join(
+        itertools.chain([COPY_HEADER], tuples, [COPY_TRAILER])))
+    cursor.copy_expert('COPY %s (%s) FROM STDIN WITH (FORMAT binary)' % (
+        table, ', '.join(columns)), payload)
+
+
+def checkpoint(source):
+    """
+    (position, imported, rejected) saved for a source file.
+    """
+    with engine.begin() as connection:
+        row = connection.execute(text(
+            'SELECT position, imported, rejected FROM %s '
+            'WHERE source = :source' % CHECKPOINT_TABLE),
+            {'source': source}).first()
+    return tuple(row) if row else (0, 0, 0)
+
+
+def reset_checkpoint(source):
+    with engine.begin() as connection:
+        connection.execute(text(
+            'DELETE FROM %s WHERE source = :source' % CHECKPOINT_TABLE),
+            {'source': source})
+
+
+def write_chunk(source, rows, progress):
+    """
+    COPY the rows of a chunk and save `progress`, (position, imported,
+    rejected) after it, in one transaction.
+    """
+    with engine.begin() as connection:
+        if rows:
+            ids = connection.execute(text(
+                "SELECT nextval(pg_get_serial_sequence('gis_polygon', 'id')) "
+                "FROM generate_series(1, :count)"),
+                {'count': len(rows)}).scalars().all()
+            cursor = connection.connection.cursor()
+            copy(cursor, 'gis_polygon', POLYGON_COLUMNS,
+                 (struct.pack('!hii', len(POLYGON_COLUMNS), 4, polygon_id) +
+                  fields for polygon_id, (_, fields, _) in zip(ids, rows)))
+            lods = [struct.pack('!hiiii', len(LOD_COLUMNS), 4, polygon_id, 4,
+                                level) + geometry
+                    for polygon_id, (_, _, row_lods) in zip(ids, rows)
+                    for level, geometry in row_lods]
+            if lods:
+                copy(cursor, 'gis_polygon_lod', LOD_COLUMNS, lods)
+        connection.execute(text(
+            'INSERT INTO %s (source, position, imported, rejected) '
+            'VALUES (:source, :position, :imported, :rejected) '
+            'ON CONFLICT (source) DO UPDATE SET position = :position, '
+            'imported = :imported, rejected = :rejected, updated = now()'
+            % CHECKPOINT_TABLE), dict(zip(
+                ('position', 'imported', 'rejected'), progress),
+                source=source))
+
+
+def setup_worker():
+    import django
+    django.setup()
+
+
+def prepare_chunks(chunks, crs, workers):
+    """
+    (chunk, result of prepare_chunk) in input order, prepared by `workers`
+    processes, or inline when there are none. At most two chunks per
+    worker are read ahead, which bounds memory.
+    """
+    if not workers:
+        for chunk in chunks:
+            yield chunk, prepare_chunk(chunk, crs)
+        return
+    context = multiprocessing.get_context(getattr(
+        settings, 'POLYGONS_GEOMETRY_START_METHOD', 'forkserver'))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=setup_worker) as pool:
+        in_flight = collections.deque()
+        for chunk in chunks:
+            in_flight.append((chunk, pool.submit(prepare_chunk, chunk, crs)))
+            if len(in_flight) >= 2 * workers:
+                chunk, future = in_flight.popleft()
+                yield chunk, future.result()
+        while in_flight:
+            chunk, future = in_flight.popleft()
+            yield chunk, future.result()
+
+
+def import_polygons(path, crs=None, workers=None, chunk_size=CHUNK_SIZE,
+                    rejected_path=None, restart=False, log=print):
+    """
+    Import the items of a file, resuming after its checkpoint unless
+    `restart`. Rejected items are written to `rejected_path` as NDJSON
+    with their errors. Returns the numbers of imported and rejected items
+    of the whole file.
+    """
+    source = os.path.abspath(path)
+    crs = (crs or source_crs(path) or GeometryField.DB_CRS).upper()
+    if restart:
+        reset_checkpoint(source)
+    position, imported, rejected = checkpoint(source)
+    if position:
+        log('Resuming after %d items' % position)
+    items = itertools.islice(read_items(path), position, None)
+    chunks = iter(lambda: list(itertools.islice(items, chunk_size)), [])
+    if workers is None:
+        workers = os.cpu_count()
+    bounds = []
+    start = time.monotonic()
+    resumed_at = position
+    with open(rejected_path or source + '.rejected.ndjson',
+              'a' if position else 'w') as rejected_file:
+        for chunk, (rows, errors, chunk_bounds) in prepare_chunks(
+                chunks, crs, workers):
+            write_chunk(source, rows, (position + len(chunk),
+                                       imported + len(rows),
+                                       rejected + len(errors)))
+            for index in sorted(errors):
+                rejected_file.write(json.dumps({
+                    'index': position + index, 'item': chunk[index],
+                    'errors': errors[index]}) + '\n')
+            rejected_file.flush()
+            position += len(chunk)
+            imported += len(rows)
+            rejected += len(errors)
+            if chunk_bounds:
+                bounds.append(chunk_bounds)
+            log('%d items read, %d imported, %d rejected, %d items/s' % (
+                position, imported, rejected, (position - resumed_at) /
+                max(time.monotonic() - start, 1e-9)))
+    invalidate_bounds(bounds)
+    return imported, rejected
@@ -0,0 +1,88 @@
+"""
+Simplified levels of detail of polygon geometries for map clients.
+
+Level 0 is the stored geometry, level n its topology-preserving
+simplification with the n-th of POLYGONS_LOD_TOLERANCES, in units of the
+database CRS. Levels are computed on write into gis_polygon_lod, so a read
+at a level selects another row instead of simplifying. `tolerance`
+simplifies in PostGIS on the fly.
+"""
+from django.conf import settings
+from geoalchemy2.shape import from_shape, to_shape
+from rest_framework import serializers
+from sqlalchemy import and_, func
+from .models import SRID, GisPolygon, GisPolygonLOD
+from .parsed import ParsedGeometry
+
+
+def tolerances():
+    return getattr(settings, 'POLYGONS_LOD_TOLERANCES', [])
+
+
+def levels():
+    return range(len(tolerances()) + 1)
+
+
+def simplified_tiers(geom):
+    """
+    (level, geometry) of every stored level of detail of a geometry.
+    Those of a ParsedGeometry were computed with it.
+    """
+    if geom is None:
+        return []
+    if isinstance(geom, ParsedGeometry):
+        return geom.tiers
+    polygon = to_shape(geom)
+    return [(level, from_shape(polygon.simplify(
+                tolerance, preserve_topology=True), srid=SRID))
+            for level, tolerance in enumerate(tolerances(), 1)]
+
+
+def lod_params(params):
+    """
+    `lod` and `tolerance` query parameters, lod is 0 when tolerance is set.
+    """
+    if 'tolerance' in params:
+        if 'lod' in params:
+            raise serializers.ValidationError(
+                'lod and tolerance are mutually exclusive')
+        try:
+            tolerance = float(params['tolerance'])
+        except ValueError:
+            tolerance = -1
+        if not tolerance > 0:
+            raise serializers.ValidationError(
+                'tolerance must be a positive number')
+        return 0, tolerance
+    try:
+        lod = int(params.get('lod', 0))
+    except ValueError:
+        lod = -1
+    if lod not in levels():
+        raise serializers.ValidationError(
+            'lod must be an integer from 0 to %d' % levels()[-1])
+    return lod, None
+
+
+def lod_geometry(lod, tolerance):
+    """
+    SQL expression of the geometry at a level of detail, or None for the
+    stored one. Polygons written before a level existed fall back to the
+    stored geometry, see the buildlods command.
+    """
+    if tolerance is not None:
+        return func.ST_SimplifyPreserveTopology(GisPolygon.geom, tolerance)
+    if lod:
+        return func.coalesce(GisPolygonLOD.geom, GisPolygon.geom)
+    return None
+
+
+def with_lod(query, lod):
+    """
+    Join the stored geometries of level `lod` to a polygon query.
+    """
+    if not lod:
+        return query
+    return query.outerjoin(GisPolygonLOD, and_(
+        GisPolygonLOD.polygon_id == GisPolygon.id,
+        GisPolygonLOD.level == lod))
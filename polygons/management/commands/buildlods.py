@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from sqlalchemy import delete, insert, select
+from polygons.lod import simplified_tiers
+from polygons.models import GisPolygon, GisPolygonLOD, Session
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = ('Recompute simplified geometries of all polygons, e.g. after '
+            'POLYGONS_LOD_TOLERANCES changed')
+
+    def handle(self, *args, **options):
+        lod_table = GisPolygonLOD.__table__
+        after = 0
+        count = 0
+        with Session() as session:
+            while True:
+                with session.begin():
+                    rows = session.execute(
+                        select(GisPolygon.id, GisPolygon.geom).where(
+                            GisPolygon.id > after).order_by(
+                            GisPolygon.id).limit(BATCH_SIZE)).all()
+                    if not rows:
+                        break
+                    ids = [row.id for row in rows]
+                    lod_rows = [{'polygon_id': row.id, 'level': level,
+                                 'geom': geom}
+                                for row in rows
+                                for level, geom in simplified_tiers(row.geom)]
+                    session.execute(delete(lod_table).where(
+                        lod_table.c.polygon_id.in_(ids)))
+                    if lod_rows:
+                        session.execute(insert(lod_table).values(lod_rows))
+                after = ids[-1]
+                count += len(ids)
+        self.stdout.write('Simplified geometries of %d polygons' % count)
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from sqlalchemy import bindparam, select, update
+from polygons.measures import measure_geom
+from polygons.models import GisPolygon, Session
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = ('Compute the stored measures of polygons written before they '
+            'existed')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Recompute the measures of every polygon')
+
+    def handle(self, *args, **options):
+        table = GisPolygon.__table__
+        statement = update(table).where(
+            table.c.id == bindparam('polygon_id'))
+        after = 0
+        count = 0
+        with Session() as session:
+            while True:
+                with session.begin():
+                    query = select(GisPolygon.id, GisPolygon.geom).where(
+                        GisPolygon.id > after,
+                        GisPolygon.geom.isnot(None))
+                    if not options['all']:
+                        query = query.where(GisPolygon.vertex_count.is_(None))
+                    rows = session.execute(query.order_by(
+                        GisPolygon.id).limit(BATCH_SIZE)).all()
+                    if not rows:
+                        break
+                    session.execute(statement, [
+                        dict(measure_geom(row.geom), polygon_id=row.id)
+                        for row in rows])
+                after = rows[-1].id
+                count += len(rows)
+        self.stdout.write('Measured %d polygons' % count)
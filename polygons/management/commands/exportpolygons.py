@@ -0,0 +1,36 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework import serializers
+from polygons.export import WRITERS, export, export_params
+
+
+class Command(BaseCommand):
+    help = ('Export polygons to NDJSON, GeoPackage or GeoParquet, picked '
+            'by the extension of the output file')
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Path of the file to write')
+        parser.add_argument('--crs', default='EPSG:4326',
+                            help='CRS of the exported geometries')
+        parser.add_argument('--class-id',
+                            help='Comma separated class ids to export')
+        parser.add_argument('--bbox',
+                            help='minx,miny,maxx,maxy in the export CRS')
+
+    def handle(self, *args, **options):
+        extension = os.path.splitext(options['output'])[1].lstrip('.')
+        if extension not in WRITERS:
+            raise CommandError('Unsupported output format %s, expected one '
+                               'of %s' % (extension, ', '.join(WRITERS)))
+        params = {'crs': options['crs']}
+        if options['class_id']:
+            params['class_id'] = options['class_id']
+        if options['bbox']:
+            params['bbox'] = options['bbox']
+        try:
+            crs, condition = export_params(params)
+        except serializers.ValidationError as e:
+            raise CommandError(' '.join(e.detail))
+        count = export(options['output'], extension, crs, condition)
+        self.stdout.write('Exported %d polygons to %s' % (
+            count, options['output']))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from polygons.importer import CHUNK_SIZE, import_polygons, source_crs
+from polygons.serializers import GeometryField
+
+
+class Command(BaseCommand):
+    help = ('Import polygons from NDJSON, GeoJSON, Shapefile or GeoPackage '
+            'through COPY, resuming an interrupted import of the same file')
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Path of the file to import')
+        parser.add_argument('--crs',
+                            help='CRS of the input, overriding the one the '
+                                 "file tells. By default the file's, or "
+                                 'EPSG:4326 when it does not tell')
+        parser.add_argument('--workers', type=int,
+                            help='Validating processes, 0 to validate '
+                                 'inline, the number of CPUs by default')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Items per COPY and checkpoint')
+        parser.add_argument('--rejected',
+                            help='NDJSON file of the rejected items, '
+                                 '<input>.rejected.ndjson by default')
+        parser.add_argument('--restart', action='store_true',
+                            help='Import from the start, ignoring the '
+                                 'checkpoint')
+
+    def handle(self, *args, **options):
+        try:
+            crs = options['crs'] or source_crs(options['input']) or \
+                GeometryField.DB_CRS
+        except (OSError, ValueError) as e:
+            raise CommandError(e)
+        if crs.upper() not in GeometryField.SUPPORTED_CRS:
+            raise CommandError('Incorrect CRS value %s' % crs)
+        imported, rejected = import_polygons(
+            options['input'], crs, options['workers'], options['chunk_size'],
+            options['rejected'], options['restart'], log=self.stdout.write)
+        self.stdout.write('Imported %d polygons, rejected %d' % (
+            imported, rejected))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from polygons import schema
+from polygons.models import engine
+
+
+class Command(BaseCommand):
+    help = ('Apply pending migrations of the polygon tables, building '
+            'indexes concurrently')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plan', action='store_true',
+                            help='List pending migrations without applying')
+
+    def handle(self, *args, **options):
+        if options['plan']:
+            for version, module in schema.pending(engine):
+                self.stdout.write(version)
+            return
+        schema.migrate(engine, log=self.stdout.write)
+        self.stdout.write('Schema is up to date')
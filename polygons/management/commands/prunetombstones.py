@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from polygons.changes import prune
+from polygons.models import Session
+
+
+class Command(BaseCommand):
+    help = ('Delete tombstones older than POLYGONS_TOMBSTONE_RETENTION_DAYS, '
+            'the change feed answers 410 to cursors before them')
+
+    def handle(self, *args, **options):
+        with Session() as session:
+            with session.begin():
+                count = prune(session)
+        self.stdout.write('Deleted %d tombstones' % count)
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from polygons.aggregates import create_rollup, refresh_rollup
+from polygons.models import engine
+
+
+class Command(BaseCommand):
+    help = ('Refresh the rollup of polygon aggregates served by '
+            '/polygons/aggregate/, run it periodically')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Recreate the rollup, needed after changing '
+                 'POLYGONS_ROLLUP_RESOLUTION')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            with engine.begin() as connection:
+                create_rollup(connection)
+        with engine.begin() as connection:
+            resolution = refresh_rollup(connection)
+        self.stdout.write('Refreshed the rollup at resolution %d' %
+                          resolution)
@@ -0,0 +1,47 @@
+"""
+Measures of polygons computed on write and stored next to the geometry, so
+responses, filters and sorts do not need to touch it.
+
+Area and perimeter (of all rings, as ST_Perimeter) are geodesic, in square
+metres and metres on the WGS84 ellipsoid. That stays exact wherever a
+polygon lies, unlike measuring in a projected CRS such as EPSG:32644
+outside of its UTM zone. The bbox and the centroid are in the database
+CRS.
+"""
+import pyproj
+from geoalchemy2.shape import to_shape
+from shapely.geometry.polygon import orient
+from .parsed import ParsedGeometry
+
+COLUMNS = ('area', 'perimeter', 'vertex_count', 'min_x', 'min_y', 'max_x',
+           'max_y', 'centroid_x', 'centroid_y')
+
+GEOD = pyproj.Geod(ellps='WGS84')
+
+
+def measure(polygon):
+    """
+    Column values of the measures of a shapely polygon, None for a missing
+    or empty one.
+    """
+    if polygon is None or polygon.is_empty:
+        return dict.fromkeys(COLUMNS)
+    # Counter-clockwise shells and clockwise holes give positive areas
+    area, _ = GEOD.geometry_area_perimeter(orient(polygon))
+    rings = [polygon.exterior, *polygon.interiors]
+    min_x, min_y, max_x, max_y = polygon.bounds
+    centroid = polygon.centroid
+    return {'area': area,
+            'perimeter': sum(GEOD.line_length(*ring.xy) for ring in rings),
+            'vertex_count': sum(len(ring.coords) for ring in rings),
+            'min_x': min_x, 'min_y': min_y, 'max_x': max_x, 'max_y': max_y,
+            'centroid_x': centroid.x, 'centroid_y': centroid.y}
+
+
+def measure_geom(geom):
+    """
+    measure() of a stored geometry, computed with it for a ParsedGeometry.
+    """
+    if isinstance(geom, ParsedGeometry):
+        return geom.measures
+    return measure(None if geom is None else to_shape(geom))
@@ -0,0 +1,108 @@
+"""
+Registry of the counters served by MetricsView.
+
+Modules that keep stats register a callable returning them as a dict.
+Histograms register themselves when created and are served, together with
+the numeric stats, in the Prometheus text format by PrometheusView.
+"""
+import bisect
+import collections
+import threading
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+           2.5, 5.0, 10.0)
+
+_providers = {}
+_histograms = {}
+
+
+def register(name, provider):
+    _providers[name] = provider
+
+
+def collect():
+    stats = {name: provider() for name, provider in _providers.items()}
+    for name, histogram in _histograms.items():
+        stats[name] = histogram.stats()
+    return stats
+
+
+class Histogram:
+    """
+    Prometheus-style histogram of observations in seconds, by label values.
+    """
+
+    def __init__(self, name, description, labels, buckets=BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # label values -> [count per bucket, +Inf count, sum]
+        self._series = collections.defaultdict(
+            lambda: [[0] * len(self.buckets), 0, 0.0])
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series[label_values]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+
+    def stats(self):
+        with self._lock:
+            return {','.join(map(str, label_values)):
+                    {'count': count, 'sum': total}
+                    for label_values, (_, count, total)
+                    in self._series.items()}
+
+    def expose(self):
+        lines = ['# HELP %s %s' % (self.name, self.description),
+                 '# TYPE %s histogram' % self.name]
+        with self._lock:
+            series = sorted(self._series.items())
+            for label_values, (bucket_counts, count, total) in series:
+                labels = ','.join('%s="%s"' % (label, value) for label, value
+                                  in zip(self.labels, label_values))
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    cumulative += bucket_count
+                    lines.append('%s_bucket{%s,le="%s"} %d' % (
+                        self.name, labels, bound, cumulative))
+                lines.append('%s_bucket{%s,le="+Inf"} %d' % (
+                    self.name, labels, count))
+                lines.append('%s_sum{%s} %s' % (self.name, labels, total))
+                lines.append('%s_count{%s} %d' % (self.name, labels, count))
+        return lines
+
+
+def histogram(name, description, labels, buckets=BUCKETS):
+    _histograms[name] = Histogram(name, description, labels, buckets)
+    return _histograms[name]
+
+
+def gauges(prefix, stats):
+    """
+    (name, value) of every number in nested stats dicts.
+    """
+    for key, value in stats.items():
+        name = '%s_%s' % (prefix, key)
+        if isinstance(value, dict):
+            yield from gauges(name, value)
+        elif isinstance(value, (int, float)):
+            yield name, value
+
+
+def prometheus():
+    """
+    Registered stats as gauges and histograms in the Prometheus text format.
+    """
+    lines = []
+    for provider_name, provider in _providers.items():
+        for name, value in gauges('polygons_' + provider_name, provider()):
+            lines.append('%s %s' % (name, float(value)))
+    for histogram in _histograms.values():
+        lines.extend(histogram.expose())
+    return '\n'.join(lines) + '\n'
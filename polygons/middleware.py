@@ -0,0 +1,100 @@
+import asyncio
+import os
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+from django.utils.deprecation import MiddlewareMixin
+from . import timing
+from .models import RequestSession
+
+
+@sync_and_async_middleware
+def db_session_middleware(get_response):
+    """
+    Close the request's SQLAlchemy session and return its connection to
+    the pool once the response is ready.
+
+    Under ASGI sync views run in the thread sync_to_async reserves for
+    thread sensitive code, so the session is removed in that thread too.
+    """
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            try:
+                return await get_response(request)
+            finally:
+                await sync_to_async(RequestSession.remove)()
+    else:
+        def middleware(request):
+            try:
+                return get_response(request)
+            finally:
+                RequestSession.remove()
+    return middleware
+
+
+class TimingMiddleware(MiddlewareMixin):
+    """
+    Time the stages of a request, see polygons.timing.
+
+    Timings are sent in a Server-Timing header and observed by the
+    polygons_request_stage_seconds histogram. Sync requests are sampled by
+    the profiler when polygons.timing.profile_requested() says so, and the
+    stacks are written for those slower than POLYGONS_PROFILE_SLOW_MS or
+    asking for a profile, see polygons.timing.profile_header_sent().
+    """
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.acall(request)
+        sampler = None
+        if timing.profile_requested(request):
+            sampler = timing.Sampler().start()
+        start = time.perf_counter()
+        with timing.collect_timings() as timings:
+            try:
+                response = self.get_response(request)
+            finally:
+                if sampler is not None:
+                    sampler.stop()
+        total = time.perf_counter() - start
+        if sampler is not None:
+            slow = getattr(settings, 'POLYGONS_PROFILE_SLOW_MS', 500) / 1000
+            if total >= slow or timing.profile_header_sent(request):
+                path = sampler.write(self.view_name(request).replace(':', '-'))
+                if path is not None:
+                    response['X-Polygons-Profile'] = os.path.basename(path)
+        return self.finish(request, response, timings, total)
+
+    async def acall(self, request):
+        start = time.perf_counter()
+        with timing.collect_timings() as timings:
+            response = await self.get_response(request)
+        return self.finish(request, response, timings,
+                           time.perf_counter() - start)
+
+    def process_template_response(self, request, response):
+        """
+        Time rendering of DRF responses, which happens after the view.
+        """
+        start = time.perf_counter()
+        timings = timing.current_timings()
+
+        def rendered(response):
+            if timings is not None:
+                timings['render'][0] += time.perf_counter() - start
+                timings['render'][1] += 1
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    @staticmethod
+    def view_name(request):
+        match = getattr(request, 'resolver_match', None)
+        return match.view_name if match else 'unresolved'
+
+    def finish(self, request, response, timings, total):
+        timing.observe(self.view_name(request), timings, total)
+        if getattr(settings, 'POLYGONS_SERVER_TIMING', True):
+            response['Server-Timing'] = timing.server_timing(timings, total)
+        return response
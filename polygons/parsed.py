@@ -0,0 +1,19 @@
+"""
+Geometries parsed in geometry_executor's process pool, carrying what the
+same job derived from them, so the request thread does not decode them
+again to write them.
+"""
+from geoalchemy2.elements import WKBElement
+
+
+class ParsedGeometry(WKBElement):
+    """
+    Stored geometry with its (level, geometry) levels of detail and its
+    measures, which polygons.lod.simplified_tiers() and
+    polygons.measures.measure_geom() return as they are.
+    """
+
+    def __init__(self, data, srid, tiers, measures):
+        super().__init__(data, srid=srid)
+        self.tiers = tiers
+        self.measures = measures
@@ -0,0 +1,137 @@
+"""
+Output formats of polygon endpoints, picked through `Accept` or `?format=`.
+
+Every renderer names the `geometry_format` GeometryField should encode
+geometries in, so views pass request.accepted_renderer.geometry_format to
+the serializer context.
+"""
+import json
+import pyproj
+from rest_framework import renderers
+
+try:
+    import fiona
+    from fiona.io import MemoryFile
+except ImportError:
+    fiona = None
+
+
+def is_error(renderer_context):
+    response = (renderer_context or {}).get('response')
+    return response is not None and response.status_code >= 400
+
+
+def to_feature(polygon):
+    properties = {key: value for key, value in polygon.items()
+                  if key not in ('id', 'geom')}
+    return {'type': 'Feature', 'id': polygon.get('id'),
+            'geometry': polygon.get('geom'), 'properties': properties}
+
+
+def to_features(data):
+    """
+    GeoJSON features of a serialized polygon or a page of them.
+    """
+    if 'results' in data:
+        return [to_feature(polygon) for polygon in data['results']]
+    return [to_feature(data)]
+
+
+class PolygonJSONRenderer(renderers.JSONRenderer):
+    geometry_format = 'wkt'
+
+
+class WKBJSONRenderer(renderers.JSONRenderer):
+    """
+    The default JSON document with hex encoded WKB instead of WKT.
+    """
+    media_type = 'application/vnd.polygons.wkb+json'
+    format = 'wkb'
+    geometry_format = 'wkb'
+
+
+class GeoJSONRenderer(renderers.JSONRenderer):
+    """
+    A Feature for a polygon, a FeatureCollection for a page of polygons.
+    """
+    media_type = 'application/geo+json'
+    format = 'geojson'
+    geometry_format = 'geojson'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is not None and not is_error(renderer_context):
+            if 'results' in data:
+                data = {'type': 'FeatureCollection',
+                        'features': to_features(data),
+                        'next_after': data.get('next_after')}
+            else:
+                data = to_feature(data)
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+class WKBRenderer(renderers.BaseRenderer):
+    """
+    Raw WKB of a single polygon geometry.
+    """
+    media_type = 'application/octet-stream'
+    format = 'wkb-bytes'
+    charset = None
+    render_style = 'binary'
+    geometry_format = 'wkb_bytes'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if is_error(renderer_context):
+            return json.dumps(data).encode()
+        return data.get('geom') or b''
+
+
+class FlatGeobufRenderer(renderers.BaseRenderer):
+    """
+    FlatGeobuf of one or many polygons, written by GDAL through fiona.
+    """
+    media_type = 'application/flatgeobuf'
+    format = 'fgb'
+    charset = None
+    render_style = 'binary'
+    geometry_format = 'geojson'
+    schema = {'geometry': 'Polygon',
+              'properties': {'id': 'int', 'class_id': 'int', 'name': 'str',
+                             'props': 'str', '_created': 'str',
+                             '_updated': 'str', 'area': 'float',
+                             'perimeter': 'float', 'vertex_count': 'int',
+                             'bbox': 'str', 'centroid': 'str'}}
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if is_error(renderer_context):
+            return json.dumps(data).encode()
+        request = (renderer_context or {}).get('request')
+        crs = 'EPSG:4326'
+        if request is not None:
+            crs = request.query_params.get('crs', crs)
+        records = []
+        for feature in to_features(data):
+            properties = dict(feature['properties'], id=feature['id'])
+            for name in ('props', 'bbox', 'centroid'):
+                properties[name] = json.dumps(properties.get(name))
+            records.append({'geometry': feature['geometry'],
+                            'properties': properties})
+        crs_wkt = pyproj.CRS(crs).to_wkt()
+        with MemoryFile(ext='.fgb') as memfile:
+            with memfile.open(driver='FlatGeobuf', schema=self.schema,
+                              crs_wkt=crs_wkt) as collection:
+                collection.writerecords(records)
+            memfile.seek(0)
+            return memfile.read()
+
+
+POLYGON_RENDERERS = [PolygonJSONRenderer, WKBJSONRenderer, GeoJSONRenderer,
+                     WKBRenderer]
+if fiona is not None:
+    POLYGON_RENDERERS.append(FlatGeobufRenderer)
+# Raw WKB holds a single geometry, pages of polygons cannot be rendered
+LIST_RENDERERS = [renderer for renderer in POLYGON_RENDERERS
+                  if renderer is not WKBRenderer]
@@ -0,0 +1,133 @@
+"""
+Versioned migrations of the SQLAlchemy tables, see manage.py migrateschema.
+
+Every module in polygons.schema.versions is a migration named by its
+version, e.g. 0002_props_jsonb. It may define
+
+- `upgrade(connection)`, run in one transaction with a lock_timeout of
+  POLYGONS_MIGRATION_LOCK_TIMEOUT, so it fails fast instead of queueing
+  every query behind its lock,
+- `backfills`, a list of (table, key, column, expression) setting `column`
+  to `expression` where it is NULL, in transactions of
+  POLYGONS_MIGRATION_BATCH_SIZE `key` values that only lock their rows,
+- `indexes`, a list of (name, CREATE INDEX statement) built one by one with
+  CREATE INDEX CONCURRENTLY outside of a transaction, which does not block
+  writes to the table,
+- `finalize(connection)`, run last like `upgrade`.
+
+Changing the type of a column would rewrite its table under an exclusive
+lock, so migrations add a column, keep it in sync with a trigger, backfill
+it, index it and swap it for the old one in `finalize`, where dropping and
+renaming columns only changes the catalog.
+
+Applied versions are recorded in polygons_schema_version in the transaction
+of the last step, so a migration interrupted before it is resumed.
+"""
+import contextlib
+import importlib
+import pkgutil
+from django.conf import settings
+from sqlalchemy import text
+from . import versions
+
+VERSION_TABLE = 'polygons_schema_version'
+
+
+def available():
+    """
+    (version, module) of every migration, oldest first.
+    """
+    names = sorted(name for _, name, _ in pkgutil.iter_modules(
+        versions.__path__) if name[:4].isdigit())
+    return [(name, importlib.import_module('%s.%s' % (versions.__name__,
+                                                      name)))
+            for name in names]
+
+
+def applied(engine):
+    with engine.begin() as connection:
+        connection.execute(text(
+            'CREATE TABLE IF NOT EXISTS %s (version text PRIMARY KEY, '
+            'applied timestamp NOT NULL DEFAULT now())' % VERSION_TABLE))
+        return set(connection.execute(text(
+            'SELECT version FROM %s' % VERSION_TABLE)).scalars())
+
+
+def pending(engine):
+    done = applied(engine)
+    return [(version, module) for version, module in available()
+            if version not in done]
+
+
+def create_index_concurrently(engine, name, statement):
+    """
+    Build an index without blocking writes. An invalid index left behind
+    by an interrupted CREATE INDEX CONCURRENTLY is dropped and rebuilt.
+    """
+    with engine.connect().execution_options(
+            isolation_level='AUTOCOMMIT') as connection:
+        valid = connection.execute(text(
+            'SELECT indisvalid FROM pg_index '
+            'WHERE indexrelid = to_regclass(:name)'), {'name': name}).scalar()
+        if valid:
+            return False
+        if valid is not None:
+            connection.execute(text('DROP INDEX CONCURRENTLY %s' % name))
+        connection.execute(text(statement.replace(
+            'CREATE INDEX', 'CREATE INDEX CONCURRENTLY IF NOT EXISTS', 1)))
+        return True
+
+
+@contextlib.contextmanager
+def locked_transaction(engine):
+    """
+    Transaction waiting at most POLYGONS_MIGRATION_LOCK_TIMEOUT for locks.
+    """
+    with engine.begin() as connection:
+        connection.execute(text("SET LOCAL lock_timeout = '%s'" % (
+            getattr(settings, 'POLYGONS_MIGRATION_LOCK_TIMEOUT', '5s'))))
+        yield connection
+
+
+def backfill(engine, table, key, column, expression):
+    """
+    Set `column` to `expression` where it is NULL, one batch of `key`
+    values per transaction. Returns the number of rows updated.
+    """
+    with engine.begin() as connection:
+        low, high = connection.execute(text(
+            'SELECT min(%s), max(%s) FROM %s' % (key, key, table))).first()
+    if low is None:
+        return 0
+    batch_size = getattr(settings, 'POLYGONS_MIGRATION_BATCH_SIZE', 10000)
+    updated = 0
+    for start in range(low, high + 1, batch_size):
+        with locked_transaction(engine) as connection:
+            updated += connection.execute(text(
+                'UPDATE %s SET %s = %s WHERE %s >= :start AND %s < :end '
+                'AND %s IS NULL' % (table, column, expression, key, key,
+                                    column)),
+                {'start': start, 'end': start + batch_size}).rowcount
+    return updated
+
+
+def migrate(engine, log=print):
+    for version, module in pending(engine):
+        if hasattr(module, 'upgrade'):
+            with locked_transaction(engine) as connection:
+                module.upgrade(connection)
+        for table, key, column, expression in getattr(module, 'backfills',
+                                                      []):
+            log('%s.%s backfilled, %d rows' % (
+                table, column, backfill(engine, table, key, column,
+                                        expression)))
+        for name, statement in getattr(module, 'indexes', []):
+            if create_index_concurrently(engine, name, statement):
+                log('Index %s built' % name)
+        with locked_transaction(engine) as connection:
+            if hasattr(module, 'finalize'):
+                module.finalize(connection)
+            connection.execute(text(
+                'INSERT INTO %s (version) VALUES (:version)' % VERSION_TABLE),
+                {'version': version})
+        log('Applied %s' % version)
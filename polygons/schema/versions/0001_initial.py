@@ -0,0 +1,23 @@
+"""
+gis_polygon as the application created it before migrations existed.
+"""
+from sqlalchemy import text
+
+
+def upgrade(connection):
+    connection.execute(text("""
+        CREATE TABLE IF NOT EXISTS gis_polygon (
+            _created timestamp without time zone,
+            _updated timestamp without time zone,
+            id serial PRIMARY KEY,
+            class_id integer,
+            name varchar,
+            props json,
+            geom geometry(POLYGON)
+        )"""))
+
+
+indexes = [
+    ('idx_gis_polygon_geom',
+     'CREATE INDEX idx_gis_polygon_geom ON gis_polygon USING gist (geom)'),
+]
@@ -0,0 +1,46 @@
+"""
+Store props as jsonb, so filters can use a GIN index.
+
+props is copied to a jsonb column, kept in sync by a trigger until it
+replaces props, so the table is not rewritten under an exclusive lock.
+"""
+from sqlalchemy import text
+
+
+def upgrade(connection):
+    connection.execute(text(
+        'ALTER TABLE gis_polygon ADD COLUMN IF NOT EXISTS props_jsonb jsonb'))
+    connection.execute(text("""
+        CREATE OR REPLACE FUNCTION gis_polygon_props_jsonb() RETURNS trigger
+        AS $$
+        BEGIN
+            NEW.props_jsonb := NEW.props::jsonb;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql"""))
+    connection.execute(text(
+        'DROP TRIGGER IF EXISTS gis_polygon_props_jsonb ON gis_polygon'))
+    connection.execute(text(
+        'CREATE TRIGGER gis_polygon_props_jsonb '
+        'BEFORE INSERT OR UPDATE ON gis_polygon '
+        'FOR EACH ROW EXECUTE FUNCTION gis_polygon_props_jsonb()'))
+
+
+backfills = [
+    ('gis_polygon', 'id', 'props_jsonb', 'props::jsonb'),
+]
+
+indexes = [
+    ('idx_gis_polygon_props',
+     'CREATE INDEX idx_gis_polygon_props ON gis_polygon '
+     'USING gin (props_jsonb jsonb_path_ops)'),
+]
+
+
+def finalize(connection):
+    connection.execute(text(
+        'DROP TRIGGER gis_polygon_props_jsonb ON gis_polygon'))
+    connection.execute(text('DROP FUNCTION gis_polygon_props_jsonb()'))
+    connection.execute(text('ALTER TABLE gis_polygon DROP COLUMN props'))
+    connection.execute(text(
+        'ALTER TABLE gis_polygon RENAME COLUMN props_jsonb TO props'))
@@ -0,0 +1,14 @@
+"""
+Simplified geometries of polygons, see polygons.lod.
+"""
+from sqlalchemy import text
+
+
+def upgrade(connection):
+    connection.execute(text("""
+        CREATE TABLE IF NOT EXISTS gis_polygon_lod (
+            polygon_id integer REFERENCES gis_polygon (id) ON DELETE CASCADE,
+            level integer,
+            geom geometry(POLYGON),
+            PRIMARY KEY (polygon_id, level)
+        )"""))
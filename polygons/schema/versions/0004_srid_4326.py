@@ -0,0 +1,58 @@
+"""
+Declare SRID 4326 on geometry columns, whose values were stored as EPSG:4326
+with SRID 0.
+
+geom is copied to a geometry(POLYGON, 4326) column, kept in sync by a
+trigger until it replaces geom, so the tables are not rewritten under an
+exclusive lock.
+"""
+from sqlalchemy import text
+
+TABLES = ('gis_polygon', 'gis_polygon_lod')
+
+
+def upgrade(connection):
+    connection.execute(text("""
+        CREATE OR REPLACE FUNCTION geom_srid_4326() RETURNS trigger AS $$
+        BEGIN
+            NEW.geom_4326 := ST_SetSRID(NEW.geom, 4326);
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql"""))
+    for table in TABLES:
+        connection.execute(text(
+            'ALTER TABLE %s ADD COLUMN IF NOT EXISTS geom_4326 '
+            'geometry(POLYGON, 4326)' % table))
+        connection.execute(text(
+            'DROP TRIGGER IF EXISTS %s_geom_srid_4326 ON %s' % (table,
+                                                                table)))
+        connection.execute(text(
+            'CREATE TRIGGER %s_geom_srid_4326 '
+            'BEFORE INSERT OR UPDATE ON %s '
+            'FOR EACH ROW EXECUTE FUNCTION geom_srid_4326()' % (table,
+                                                                 table)))
+
+
+backfills = [
+    ('gis_polygon', 'id', 'geom_4326', 'ST_SetSRID(geom, 4326)'),
+    ('gis_polygon_lod', 'polygon_id', 'geom_4326', 'ST_SetSRID(geom, 4326)'),
+]
+
+indexes = [
+    # Renamed to idx_gis_polygon_geom once it replaces the index of geom
+    ('idx_gis_polygon_geom_4326',
+     'CREATE INDEX idx_gis_polygon_geom_4326 ON gis_polygon '
+     'USING gist (geom_4326)'),
+]
+
+
+def finalize(connection):
+    for table in TABLES:
+        connection.execute(text(
+            'DROP TRIGGER %s_geom_srid_4326 ON %s' % (table, table)))
+        connection.execute(text('ALTER TABLE %s DROP COLUMN geom' % table))
+        connection.execute(text(
+            'ALTER TABLE %s RENAME COLUMN geom_4326 TO geom' % table))
+    connection.execute(text('DROP FUNCTION geom_srid_4326()'))
+    connection.execute(text('ALTER INDEX idx_gis_polygon_geom_4326 '
+                            'RENAME TO idx_gis_polygon_geom'))
@@ -0,0 +1,15 @@
+"""
+B-tree indexes for the filters, orderings and lookups of the API.
+"""
+
+indexes = [
+    # class_id filters paginated by id, most polygons have no class
+    ('idx_gis_polygon_class_id',
+     'CREATE INDEX idx_gis_polygon_class_id ON gis_polygon (class_id, id) '
+     'WHERE class_id IS NOT NULL'),
+    ('idx_gis_polygon_name',
+     'CREATE INDEX idx_gis_polygon_name ON gis_polygon (name)'),
+    # Recently changed polygons, paginated by id
+    ('idx_gis_polygon_updated',
+     'CREATE INDEX idx_gis_polygon_updated ON gis_polygon (_updated, id)'),
+]
@@ -0,0 +1,19 @@
+"""
+Tombstones of deleted polygons for the change feed, see polygons.changes.
+"""
+from sqlalchemy import text
+
+
+def upgrade(connection):
+    connection.execute(text("""
+        CREATE TABLE IF NOT EXISTS gis_polygon_tombstone (
+            id integer PRIMARY KEY,
+            _deleted timestamp without time zone
+        )"""))
+
+
+indexes = [
+    ('idx_gis_polygon_tombstone_deleted',
+     'CREATE INDEX idx_gis_polygon_tombstone_deleted ON gis_polygon_tombstone '
+     '(_deleted, id)'),
+]
@@ -0,0 +1,15 @@
+"""
+Progress of manage.py importpolygons by source file, see polygons.importer.
+"""
+from sqlalchemy import text
+
+
+def upgrade(connection):
+    connection.execute(text("""
+        CREATE TABLE IF NOT EXISTS polygons_import_checkpoint (
+            source text PRIMARY KEY,
+            position bigint NOT NULL,
+            imported bigint NOT NULL,
+            rejected bigint NOT NULL,
+            updated timestamp NOT NULL DEFAULT now()
+        )"""))
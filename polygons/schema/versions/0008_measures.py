@@ -0,0 +1,28 @@
+"""
+Measures of the geometry stored with every polygon, see polygons.measures.
+Fill them in for existing polygons with manage.py buildmeasures.
+"""
+from sqlalchemy import text
+
+COLUMNS = [('area', 'double precision'), ('perimeter', 'double precision'),
+           ('vertex_count', 'integer'), ('min_x', 'double precision'),
+           ('min_y', 'double precision'), ('max_x', 'double precision'),
+           ('max_y', 'double precision'), ('centroid_x', 'double precision'),
+           ('centroid_y', 'double precision')]
+
+
+def upgrade(connection):
+    # Nullable columns without a default are added without a table rewrite
+    connection.execute(text('ALTER TABLE gis_polygon %s' % ', '.join(
+        'ADD COLUMN IF NOT EXISTS %s %s' % column for column in COLUMNS)))
+
+
+indexes = [
+    ('idx_gis_polygon_area',
+     'CREATE INDEX idx_gis_polygon_area ON gis_polygon (area, id)'),
+    ('idx_gis_polygon_perimeter',
+     'CREATE INDEX idx_gis_polygon_perimeter ON gis_polygon (perimeter, id)'),
+    ('idx_gis_polygon_vertex_count',
+     'CREATE INDEX idx_gis_polygon_vertex_count ON gis_polygon '
+     '(vertex_count, id)'),
+]
@@ -0,0 +1,47 @@
+"""
+Materialized rollup of polygon aggregates by class_id and grid cell at
+resolution 8, see polygons.aggregates. It is created empty, manage.py
+refreshrollup fills it in, and `refreshrollup --rebuild` recreates it at
+POLYGONS_ROLLUP_RESOLUTION. Its comment holds the resolution.
+"""
+from sqlalchemy import text
+
+
+def upgrade(connection):
+    connection.execute(text("""
+        CREATE TABLE IF NOT EXISTS polygons_rollup_refresh (
+            resolution integer NOT NULL,
+            refreshed timestamp NOT NULL
+        )"""))
+    # Cells of 360 / 2**8 = 1.40625 degrees
+    connection.execute(text("""
+        CREATE MATERIALIZED VIEW IF NOT EXISTS gis_polygon_rollup AS
+        SELECT polygon.class_id,
+               CAST(floor((polygon.x + 180) / 1.40625) AS integer) AS cell_x,
+               CAST(floor((polygon.y + 90) / 1.40625) AS integer) AS cell_y,
+               count(*) AS count, sum(polygon.area) AS area,
+               min(polygon.min_x) AS min_x, min(polygon.min_y) AS min_y,
+               max(polygon.max_x) AS max_x, max(polygon.max_y) AS max_y
+        FROM (
+            SELECT class_id,
+                   coalesce(centroid_x, ST_X(ST_Centroid(geom))) AS x,
+                   coalesce(centroid_y, ST_Y(ST_Centroid(geom))) AS y,
+                   coalesce(area, ST_Area(CAST(geom AS
+                                               geography(GEOMETRY, 4326))))
+                       AS area,
+                   coalesce(min_x, ST_XMin(geom)) AS min_x,
+                   coalesce(min_y, ST_YMin(geom)) AS min_y,
+                   coalesce(max_x, ST_XMax(geom)) AS max_x,
+                   coalesce(max_y, ST_YMax(geom)) AS max_y
+            FROM gis_polygon
+            WHERE geom IS NOT NULL
+        ) AS polygon
+        GROUP BY polygon.class_id,
+                 CAST(floor((polygon.x + 180) / 1.40625) AS integer),
+                 CAST(floor((polygon.y + 90) / 1.40625) AS integer)
+        WITH NO DATA"""))
+    connection.execute(text(
+        "COMMENT ON MATERIALIZED VIEW gis_polygon_rollup IS '8'"))
+    connection.execute(text(
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_gis_polygon_rollup '
+        'ON gis_polygon_rollup (class_id, cell_x, cell_y)'))
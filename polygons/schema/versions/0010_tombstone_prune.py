@@ -0,0 +1,13 @@
+"""
+Newest tombstone deleted by manage.py prunetombstones, so the change feed
+only answers 410 to cursors before it, see polygons.changes.
+"""
+from sqlalchemy import text
+
+
+def upgrade(connection):
+    connection.execute(text("""
+        CREATE TABLE IF NOT EXISTS polygons_tombstone_prune (
+            _deleted timestamp NOT NULL,
+            id integer NOT NULL
+        )"""))
@@ -1,10 +1,67 @@
+import collections
 import datetime
+import json
+import struct
+from geoalchemy2.elements import WKBElement
 from geoalchemy2.shape import from_shape, to_shape
 from rest_framework import serializers
+from sqlalchemy import null
 import shapely
-from shapely.ops import transform
-import pyproj
-from .models import GisPolygon
+import shapely.errors
+from shapely.geometry import mapping
+from shapely.geometry.base import BaseGeometry
+from .crs import reproject, reproject_many, transformers
+from .executor import geometry_executor
+from .lod import simplified_tiers, tolerances
+from .measures import measure_geom
+from .models import SRID, GisPolygon, GisPolygonLOD
+from .parsed import ParsedGeometry
+from .timing import stage
+from .validation import (
+    GeometryError, check_payload, check_polygon, count, policy)
+
+
+PendingGeometry = collections.namedtuple('PendingGeometry', ['polygon', 'crs'])
+
+# Flag of the geometry type in EWKB followed by an SRID
+EWKB_SRID = 0x20000000
+
+
+def iso_wkb(wkb):
+    """
+    WKB of a stored EWKB geometry without its SRID, as ST_AsBinary and
+    shapely write it.
+    """
+    byte_order = '<' if wkb[0] else '>'
+    geometry_type, = struct.unpack_from(byte_order + 'I', wkb, 1)
+    if not geometry_type & EWKB_SRID:
+        return wkb
+    return wkb[:1] + struct.pack(
+        byte_order + 'I', geometry_type & ~EWKB_SRID) + wkb[9:]
+
+
+class ReprojectedRow:
+    """
+    A polygon row with `geom` replaced by a shapely geometry that is already
+    in the output CRS.
+    """
+
+    def __init__(self, row, geom):
+        self._row = row
+        self.geom = geom
+
+    def __getattr__(self, name):
+        return getattr(self._row, name)
+
+
+def wkt_from_wkb(wkb, crs):
+    """
+    WKT of a WKB polygon in `crs`, the same text as str() of the polygon.
+    """
+    if geometry_executor.offloads(len(wkb) // 16):
+        return geometry_executor.encode(wkb, crs, crs, 'wkt')
+    with stage('decode'):
+        return shapely.to_wkt(shapely.from_wkb(wkb), rounding_precision=-1)
 
 
 class GeometryField(serializers.Field):
@@ -15,35 +72,172 @@ class GeometryField(serializers.Field):
     SUPPORTED_CRS = ['EPSG:4326', 'EPSG:32644']
 
     def to_internal_value(self, data):
-        polygon = shapely.wkt.loads(data['polygon'])
-        if 'crs' in data:
-            from_crs = data['crs'].upper()
-            if from_crs != GeometryField.DB_CRS:
-                if from_crs in GeometryField.SUPPORTED_CRS:
-                    from_crs = pyproj.CRS(from_crs)
-                    to_crs = pyproj.CRS(GeometryField.DB_CRS)
-                    project = pyproj.Transformer.from_crs(
-                        from_crs, to_crs, always_xy=True).transform
-                    polygon = transform(project, polygon)
-                else:
-                    msg = 'Incorrect CRS value %s'
-                    raise serializers.ValidationError(msg % data['crs'])
-        return from_shape(polygon)
+        if not isinstance(data, dict) or 'polygon' not in data:
+            raise serializers.ValidationError(
+                'geom must be an object with a WKT polygon')
+        crs = data.get('crs', GeometryField.DB_CRS)
+        if not isinstance(crs, str):
+            raise serializers.ValidationError('crs must be a string')
+        from_crs = crs.upper()
+        if from_crs != GeometryField.DB_CRS and \
+                from_crs not in GeometryField.SUPPORTED_CRS:
+            msg = 'Incorrect CRS value %s'
+            raise serializers.ValidationError(msg % data['crs'])
+        invalid_geometry = policy()
+        try:
+            vertices = check_payload(data['polygon'])
+            if not self.context.get('batch_reprojection') and \
+                    geometry_executor.offloads(vertices):
+                # Levels of detail and measures come from the same job
+                parsed = geometry_executor.parse(
+                    data['polygon'], from_crs, GeometryField.DB_CRS,
+                    invalid_geometry, tolerances())
+                return ParsedGeometry(
+                    memoryview(parsed.wkb), SRID,
+                    [(level, WKBElement(memoryview(wkb), srid=SRID))
+                     for level, wkb in enumerate(parsed.tiers, 1)],
+                    parsed.measures)
+            with stage('decode'):
+                polygon = shapely.wkt.loads(data['polygon'])
+            polygon = check_polygon(polygon, invalid_geometry)
+        except shapely.errors.ShapelyError:
+            count('rejected', 'parse')
+            raise serializers.ValidationError('polygon must be a WKT polygon')
+        except GeometryError as e:
+            count('rejected', e.check)
+            raise serializers.ValidationError(e.message)
+        if from_crs != GeometryField.DB_CRS:
+            if self.context.get('batch_reprojection'):
+                return PendingGeometry(polygon, from_crs)
+            polygon = reproject(polygon, transformers.get(
+                from_crs, GeometryField.DB_CRS))
+        return from_shape(polygon, srid=SRID)
 
     def to_representation(self, value):
-        polygon = to_shape(value)
+        """
+        Geometry in context['crs'] encoded as context['geometry_format'].
+
+        Formats are `wkt` (default), `wkb` (hex string), `wkb_bytes` and
+        `geojson`. WKB without reprojection is the stored value as is,
+        large geometries are encoded in geometry_executor's process pool.
+        """
         to_crs = self.context['crs'].upper()
-        if to_crs != GeometryField.DB_CRS:
-            if to_crs in GeometryField.SUPPORTED_CRS:
-                from_crs = pyproj.CRS(GeometryField.DB_CRS)
-                project = pyproj.Transformer.from_crs(
-                    from_crs, pyproj.CRS(to_crs), always_xy=True).transform
-                polygon = transform(project, polygon)
-            else:
-                msg = 'Incorrect CRS value %s'
-                raise serializers.ValidationError(msg % self.context['crs'])
-        data = {'polygon': str(polygon), 'crs': 'EPSG:4326'}
-        return data
+        if self.context.get('encoded_in_db'):
+            if self.context.get('geometry_format', 'wkt') == 'wkt':
+                # PostGIS sends WKT as WKB, see encoding.db_encoded_geometry
+                return self.wrap_encoding(wkt_from_wkb(bytes(value), to_crs))
+            return self.wrap_encoding(value)
+        if to_crs != GeometryField.DB_CRS and \
+                to_crs not in GeometryField.SUPPORTED_CRS:
+            msg = 'Incorrect CRS value %s'
+            raise serializers.ValidationError(msg % self.context['crs'])
+        geometry_format = self.context.get('geometry_format', 'wkt')
+        if isinstance(value, BaseGeometry):
+            # Reprojected by GisPolygonListSerializer
+            polygon = value
+        elif to_crs == GeometryField.DB_CRS and \
+                geometry_format in ('wkb', 'wkb_bytes'):
+            polygon = None
+            wkb = iso_wkb(bytes(value.data))
+        elif geometry_executor.offloads(len(value.data) // 16):
+            # A WKB polygon takes 16 bytes per 2D vertex
+            return self.wrap_encoding(geometry_executor.encode(
+                bytes(value.data), GeometryField.DB_CRS, to_crs,
+                geometry_format))
+        else:
+            with stage('decode'):
+                polygon = to_shape(value)
+            if to_crs != GeometryField.DB_CRS:
+                polygon = reproject(polygon, transformers.get(
+                    GeometryField.DB_CRS, to_crs))
+        if polygon is not None:
+            if geometry_format == 'wkt':
+                return {'polygon': str(polygon), 'crs': 'EPSG:4326'}
+            if geometry_format == 'geojson':
+                return mapping(polygon)
+            wkb = polygon.wkb
+        if geometry_format == 'wkb_bytes':
+            return wkb
+        return {'wkb': wkb.hex(), 'crs': to_crs}
+
+    def wrap_encoding(self, value):
+        """
+        Representation of a geometry encoded as context['geometry_format'].
+        """
+        geometry_format = self.context.get('geometry_format', 'wkt')
+        if geometry_format == 'wkt':
+            return {'polygon': value, 'crs': 'EPSG:4326'}
+        if geometry_format == 'geojson':
+            return json.loads(value)
+        if geometry_format == 'wkb_bytes':
+            return bytes(value)
+        return {'wkb': bytes(value).hex(),
+                'crs': self.context['crs'].upper()}
+
+
+class GisPolygonListSerializer(serializers.ListSerializer):
+    """
+    Validates polygons one by one, so a bad item does not reject the batch.
+
+    With `batch_reprojection` in the context geometries are reprojected
+    after validation with one transform call per CRS, and before
+    representation with one transform call.
+    """
+
+    def to_representation(self, data):
+        to_crs = self.context.get('crs', GeometryField.DB_CRS).upper()
+        if not self.context.get('batch_reprojection') or \
+                self.context.get('encoded_in_db') or \
+                to_crs == GeometryField.DB_CRS or \
+                to_crs not in GeometryField.SUPPORTED_CRS:
+            return super().to_representation(data)
+        rows = list(data)
+        with stage('decode'):
+            polygons = [to_shape(row.geom) for row in rows
+                        if row.geom is not None]
+        polygons = iter(reproject_many(polygons, transformers.get(
+            GeometryField.DB_CRS, to_crs)))
+        return super().to_representation([
+            row if row.geom is None else ReprojectedRow(row, next(polygons))
+            for row in rows])
+
+    def validate_items(self):
+        """
+        Return a list of (index, validated_data) and a dict of errors by index.
+        """
+        valid = []
+        errors = {}
+        for index, item in enumerate(self.initial_data):
+            try:
+                valid.append((index, self.child.run_validation(item)))
+            except serializers.ValidationError as e:
+                errors[index] = e.detail
+        pending = collections.defaultdict(list)
+        for _, validated_data in valid:
+            geom = validated_data.get('geom')
+            if isinstance(geom, PendingGeometry):
+                pending[geom.crs].append(validated_data)
+        for crs, group in pending.items():
+            polygons = reproject_many(
+                [validated_data['geom'].polygon for validated_data in group],
+                transformers.get(crs, GeometryField.DB_CRS))
+            for validated_data, polygon in zip(group, polygons):
+                validated_data['geom'] = from_shape(polygon, srid=SRID)
+        return valid, errors
+
+    def create_rows(self, items):
+        """
+        Column values for a multi-row INSERT into gis_polygon.
+        """
+        now = datetime.datetime.utcnow()
+        rows = []
+        for validated_data in items:
+            row = {'_created': now, '_updated': now, 'class_id': None,
+                   'name': None, 'props': null(), 'geom': None}
+            row.update(validated_data)
+            row.update(measure_geom(row['geom']))
+            rows.append(row)
+        return rows
 
 
 class GisPolygonSerializer(serializers.Serializer):
@@ -56,15 +250,59 @@ class GisPolygonSerializer(serializers.Serializer):
     name = serializers.CharField(max_length=65535)
     props = serializers.JSONField(required=False)
     geom = GeometryField(required=False)
+    # Stored measures, see polygons.measures
+    area = serializers.FloatField(read_only=True)
+    perimeter = serializers.FloatField(read_only=True)
+    vertex_count = serializers.IntegerField(read_only=True)
+    bbox = serializers.SerializerMethodField()
+    centroid = serializers.SerializerMethodField()
+
+    class Meta:
+        list_serializer_class = GisPolygonListSerializer
+
+    def get_bbox(self, polygon):
+        if polygon.min_x is None:
+            return None
+        return [polygon.min_x, polygon.min_y, polygon.max_x, polygon.max_y]
+
+    def get_centroid(self, polygon):
+        if polygon.centroid_x is None:
+            return None
+        return [polygon.centroid_x, polygon.centroid_y]
 
     def create(self, validated_data):
         now = datetime.datetime.utcnow()
-        return GisPolygon(_created=now, _updated=now, **validated_data)
+        polygon = GisPolygon(_created=now, _updated=now, **validated_data)
+        polygon.lods = [GisPolygonLOD(level=level, geom=geom)
+                        for level, geom in simplified_tiers(polygon.geom)]
+        for name, value in measure_geom(polygon.geom).items():
+            setattr(polygon, name, value)
+        return polygon
+
+    def update_values(self, validated_data):
+        """
+        Column values of a partial UPDATE of the validated fields only, see
+        polygons.updates.
+        """
+        values = dict(validated_data, _updated=datetime.datetime.utcnow())
+        if 'geom' in validated_data:
+            values.update(measure_geom(validated_data['geom']))
+        return values
 
     def update(self, instance, validated_data):
         instance._updated = datetime.datetime.utcnow()
         instance.class_id = validated_data.get('class_id', instance.class_id)
         instance.name = validated_data.get('name', instance.name)
         instance.props = validated_data.get('props', instance.props)
-        instance.geom = validated_data.get('geom', instance.geom)
+        if 'geom' in validated_data:
+            instance.geom = validated_data['geom']
+            existing = {lod.level: lod for lod in instance.lods}
+            lods = []
+            for level, geom in simplified_tiers(instance.geom):
+                lod = existing.get(level) or GisPolygonLOD(level=level)
+                lod.geom = geom
+                lods.append(lod)
+            instance.lods = lods
+            for name, value in measure_geom(instance.geom).items():
+                setattr(instance, name, value)
         return instance
@@ -0,0 +1,258 @@
+"""
+Mapbox Vector Tiles of gis_polygon built by PostGIS with ST_AsMVT.
+
+Tiles are cached on disk under POLYGONS_TILE_CACHE_DIR as z/x/y.mvt. Writes
+invalidate only the cached tiles the bbox of each old and new geometry
+touches, buffer included. The cache is local to the host, like the local
+tier of polygons.cache.
+"""
+import math
+import os
+import tempfile
+import threading
+import uuid
+from django.conf import settings
+from geoalchemy2.shape import to_shape
+from shapely.geometry import box
+from sqlalchemy import func, literal_column, select
+from . import metrics
+from .filters import db_geometry
+from .lod import lod_geometry, tolerances, with_lod
+from .models import GisPolygon
+
+EXTENT = 4096
+BUFFER = 64
+LAYER = 'polygons'
+# Changed by every invalidation, see TileCache.set
+VERSION_FILE = 'version'
+# Above this many tiles of a zoom in a bbox, TileCache.invalidate lists the
+# cached ones instead of unlinking every path of the range
+MAX_UNLINKS = 4096
+MAX_LATITUDE = 85.0511287798066
+
+
+def tile_exists(z, x, y):
+    max_zoom = getattr(settings, 'POLYGONS_TILE_MAX_ZOOM', 22)
+    return 0 <= z <= max_zoom and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def tile_coords(lon, lat, z):
+    """
+    Fractional x and y of a point in the tile grid of zoom z.
+    """
+    n = 2 ** z
+    lat = math.radians(max(-MAX_LATITUDE, min(MAX_LATITUDE, lat)))
+    x = (lon + 180) / 360 * n
+    y = (1 - math.asinh(math.tan(lat)) / math.pi) / 2 * n
+    return x, y
+
+
+def tile_bounds(z, x, y, margin=0.0):
+    """
+    (minx, miny, maxx, maxy) in EPSG:4326 of a tile grown by `margin` tiles.
+    """
+    n = 2 ** z
+
+    def lat(row):
+        return math.degrees(
+            math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return ((x - margin) / n * 360 - 180, lat(y + 1 + margin),
+            (x + 1 + margin) / n * 360 - 180, lat(y - margin))
+
+
+def tile_lod(z):
+    """
+    Coarsest stored level of detail finer than a pixel at zoom z.
+    """
+    pixel = 360 / 2 ** z / EXTENT
+    lod = 0
+    for level, tolerance in enumerate(tolerances(), 1):
+        if tolerance <= pixel:
+            lod = level
+    return lod
+
+
+def tile_query(z, x, y):
+    """
+    SELECT of the MVT of a tile with id, name, class_id and the props keys
+    listed in POLYGONS_TILE_PROPS as feature attributes.
+
+    Geometries come from the level of detail matching the zoom and are
+    clipped and snapped to the tile grid by ST_AsMVTGeom.
+    """
+    lod = tile_lod(z)
+    geom = lod_geometry(lod, None)
+    if geom is None:
+        geom = GisPolygon.geom
+    mercator = func.ST_Transform(geom, 3857)
+    columns = [GisPolygon.id, GisPolygon.name, GisPolygon.class_id]
+    columns += [GisPolygon.props[key].as_string().label(key)
+                for key in getattr(settings, 'POLYGONS_TILE_PROPS', [])]
+    columns.append(func.ST_AsMVTGeom(
+        mercator, func.ST_TileEnvelope(z, x, y), EXTENT, BUFFER,
+        True).label('geom'))
+    envelope = db_geometry(box(*tile_bounds(z, x, y, BUFFER / EXTENT)))
+    features = with_lod(select(*columns), lod).where(
+        GisPolygon.geom.intersects(envelope)).subquery('features')
+    return select(func.ST_AsMVT(
+        literal_column('features'), LAYER, EXTENT, 'geom', 'id')
+    ).select_from(features)
+
+
+class TileCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+
+    @property
+    def directory(self):
+        return getattr(settings, 'POLYGONS_TILE_CACHE_DIR', None)
+
+    def path(self, z, x, y):
+        return os.path.join(self.directory, str(z), str(x), '%d.mvt' % y)
+
+    def get(self, z, x, y):
+        if not self.directory:
+            return None
+        try:
+            with open(self.path(z, x, y), 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            content = None
+        with self._lock:
+            if content is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return content
+
+    def write(self, path, content):
+        """
+        Write a file through a temporary file, so readers never see a
+        partial one.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def version(self):
+        """
+        Token of the last invalidation of any process, None before the
+        first one.
+        """
+        if not self.directory:
+            return None
+        try:
+            with open(os.path.join(self.directory, VERSION_FILE), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, z, x, y, content, version):
+        """
+        Cache a tile rendered after reading `version`. It is dropped again
+        when an invalidation happened since, which may have missed it.
+        """
+        if not self.directory:
+            return
+        path = self.path(z, x, y)
+        self.write(path, content)
+        if self.version() != version:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def invalidate(self, bounds):
+        """
+        Delete cached tiles of any zoom whose buffered area intersects one
+        of `bounds`, (minx, miny, maxx, maxy) boxes in EPSG:4326.
+
+        The version changes before tiles are deleted, so a tile rendered
+        meanwhile is either deleted here or dropped by set(). The paths of
+        the tiles in range are unlinked directly, the cached tiles of a
+        zoom are only listed for ranges of more than MAX_UNLINKS tiles.
+        """
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        self.write(os.path.join(self.directory, VERSION_FILE),
+                   uuid.uuid4().bytes)
+        margin = BUFFER / EXTENT
+        deleted = 0
+        for z in range(getattr(settings, 'POLYGONS_TILE_MAX_ZOOM', 22) + 1):
+            if not os.path.isdir(os.path.join(self.directory, str(z))):
+                continue
+            for minx, miny, maxx, maxy in bounds:
+                x0, y0 = tile_coords(minx, maxy, z)
+                x1, y1 = tile_coords(maxx, miny, z)
+                x_range = range(max(int(x0 - margin), 0),
+                                min(int(x1 + margin), 2 ** z - 1) + 1)
+                y_range = range(max(int(y0 - margin), 0),
+                                min(int(y1 + margin), 2 ** z - 1) + 1)
+                if len(x_range) * len(y_range) > MAX_UNLINKS:
+                    paths = self.cached_paths(z, x_range, y_range)
+                else:
+                    paths = [self.path(z, x, y)
+                             for x in x_range for y in y_range]
+                for path in paths:
+                    try:
+                        os.remove(path)
+                        deleted += 1
+                    except FileNotFoundError:
+                        pass
+        with self._lock:
+            self.invalidated += deleted
+
+    def cached_paths(self, z, x_range, y_range):
+        """
+        Paths of the cached tiles of zoom `z` within the ranges.
+        """
+        z_dir = os.path.join(self.directory, str(z))
+        paths = []
+        for x in os.listdir(z_dir):
+            if not x.isdigit() or int(x) not in x_range:
+                continue
+            x_dir = os.path.join(z_dir, x)
+            try:
+                names = os.listdir(x_dir)
+            except FileNotFoundError:
+                continue
+            for name in names:
+                y, ext = os.path.splitext(name)
+                if ext == '.mvt' and y.isdigit() and int(y) in y_range:
+                    paths.append(os.path.join(x_dir, name))
+        return paths
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'invalidated': self.invalidated}
+
+
+tile_cache = TileCache()
+metrics.register('tile_cache', tile_cache.stats)
+
+
+def invalidate_tiles(geoms):
+    """
+    Invalidate cached tiles under the bbox of each stored geometry. Pass
+    all geometries of a batch at once, the cache is walked once.
+    """
+    shapes = [to_shape(geom) for geom in geoms if geom is not None]
+    invalidate_bounds([shape.bounds for shape in shapes
+                       if not shape.is_empty])
+
+
+def invalidate_bounds(bounds):
+    """
+    Invalidate cached tiles under (minx, miny, maxx, maxy) boxes in
+    EPSG:4326, None entries are skipped.
+    """
+    bounds = [b for b in bounds if b is not None and None not in b]
+    if bounds:
+        tile_cache.invalidate(bounds)
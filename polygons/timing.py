@@ -0,0 +1,189 @@
+"""
+Timings of the stages of a request and an opt-in sampling profiler, both
+driven by polygons.middleware.TimingMiddleware.
+
+Stages are `db` (SQLAlchemy cursor executions), `decode` (WKB and WKT to
+shapely), `transform` (pyproj), `serialize` (serializer.data, includes
+decode and transform) and `render`. Code marks a stage with
+`with stage('name'):`, which is free outside of a request.
+"""
+import collections
+import contextlib
+import contextvars
+import hmac
+import os
+import sys
+import threading
+import time
+from django.conf import settings
+from sqlalchemy import event
+from . import metrics
+
+_timings = contextvars.ContextVar('polygons_timings', default=None)
+
+stage_seconds = metrics.histogram(
+    'polygons_request_stage_seconds',
+    'Time spent in each stage of a request, total included',
+    ('view', 'stage'))
+
+
+@contextlib.contextmanager
+def collect_timings():
+    """
+    Collect stage timings in the current context into the yielded dict of
+    stage -> [seconds, count].
+    """
+    timings = collections.defaultdict(lambda: [0.0, 0])
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def current_timings():
+    return _timings.get()
+
+
+def record(name, seconds):
+    timings = _timings.get()
+    if timings is not None:
+        timings[name][0] += seconds
+        timings[name][1] += 1
+
+
+@contextlib.contextmanager
+def stage(name):
+    if _timings.get() is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def server_timing(timings, total):
+    """
+    Server-Timing header value, durations in milliseconds.
+    """
+    entries = ['%s;dur=%.1f' % (name, seconds * 1000)
+               for name, (seconds, _) in timings.items()]
+    if 'db' in timings:
+        entries[list(timings).index('db')] += ';desc="%d queries"' % (
+            timings['db'][1])
+    entries.append('total;dur=%.1f' % (total * 1000))
+    return ', '.join(entries)
+
+
+def observe(view, timings, total):
+    for name, (seconds, _) in timings.items():
+        stage_seconds.observe(seconds, view, name)
+    stage_seconds.observe(total, view, 'total')
+
+
+def instrument_engine(engine):
+    """
+    Record the time of every cursor execution of an Engine as `db`.
+    """
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context,
+                              executemany):
+        conn.info.setdefault('polygons_query_start', []).append(
+            time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context,
+                             executemany):
+        record('db', time.perf_counter() -
+               conn.info['polygons_query_start'].pop())
+
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(context):
+        # No connection yet when connecting failed
+        if context.connection is None:
+            return
+        starts = context.connection.info.get('polygons_query_start')
+        if starts:
+            record('db', time.perf_counter() - starts.pop())
+
+
+class Sampler:
+    """
+    Sampling profiler of one thread, collecting its stacks every
+    POLYGONS_PROFILE_INTERVAL seconds from a background thread.
+
+    Stacks are written in the collapsed format ("frame;frame;frame count")
+    of flamegraph.pl, speedscope and similar tools.
+    """
+
+    def __init__(self, thread_id=None, interval=None):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval or getattr(
+            settings, 'POLYGONS_PROFILE_INTERVAL', 0.005)
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='polygons-sampler')
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append('%s (%s:%d)' % (
+                    code.co_name, os.path.basename(code.co_filename),
+                    code.co_firstlineno))
+                frame = frame.f_back
+            if frames:
+                self.stacks[';'.join(reversed(frames))] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        return ''.join('%s %d\n' % (stack, count)
+                       for stack, count in self.stacks.most_common())
+
+    def write(self, name):
+        directory = getattr(settings, 'POLYGONS_PROFILE_DIR', None)
+        if not directory or not self.stacks:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, '%s-%d.folded' % (
+            name, time.time() * 1000))
+        with open(path, 'w') as f:
+            f.write(self.collapsed())
+        return path
+
+
+def profile_header_sent(request):
+    """
+    Whether the request asks for a profile with POLYGONS_PROFILE_HEADER,
+    set to POLYGONS_PROFILE_SECRET, or to anything when DEBUG is on and
+    there is no secret.
+    """
+    header = getattr(settings, 'POLYGONS_PROFILE_HEADER', None)
+    if not header or header not in request.headers:
+        return False
+    secret = getattr(settings, 'POLYGONS_PROFILE_SECRET', None)
+    if not secret:
+        return settings.DEBUG
+    return hmac.compare_digest(request.headers[header].encode(),
+                               secret.encode())
+
+
+def profile_requested(request):
+    """
+    Whether to sample a request: POLYGONS_PROFILE is on, or the request
+    asks for it, see profile_header_sent().
+    """
+    return getattr(settings, 'POLYGONS_PROFILE', False) or \
+        profile_header_sent(request)
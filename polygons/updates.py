@@ -0,0 +1,95 @@
+"""
+Partial updates of a polygon, see DetailView.patch.
+
+A PATCH writes only the columns of its payload and _updated, plus the
+measures and levels of detail when geom is one of them, so attribute edits
+neither read nor rewrite the geometry.
+
+The ETags of DetailView in If-Match, or the `_updated` of the polygon in
+the payload, make the update conditional: when the polygon changed since,
+nothing is written and the view answers 412 Precondition Failed.
+"""
+import datetime
+import re
+from django.utils.http import parse_etags
+from rest_framework import serializers
+from sqlalchemy import delete, func, insert, select, update
+from .lod import simplified_tiers
+from .models import GisPolygon, GisPolygonLOD
+
+# make_etag() of DetailView, the version is _updated in ISO 8601. If-Match
+# compares strongly, weak tags never match.
+ETAG = re.compile(r'^"(\d+)-([^"]*?)-EPSG:')
+
+
+def expected_versions(polygon_id, if_match, data):
+    """
+    Sets of _updated values the polygon must have for the update to apply,
+    one for If-Match and one for `_updated` in the payload.
+    """
+    versions = []
+    if if_match:
+        etags = parse_etags(if_match)
+        if '*' not in etags:
+            matching = set()
+            for etag in etags:
+                match = ETAG.match(etag)
+                if match and int(match.group(1)) == polygon_id:
+                    try:
+                        matching.add(datetime.datetime.fromisoformat(
+                            match.group(2)))
+                    except ValueError:
+                        pass
+            versions.append(matching)
+    if data.get('_updated') is not None:
+        try:
+            versions.append({datetime.datetime.fromisoformat(
+                str(data['_updated']))})
+        except ValueError:
+            raise serializers.ValidationError(
+                '_updated must be the _updated of the polygon')
+    return versions
+
+
+def lock_query(polygon_id):
+    """
+    _updated and bbox of a polygon, locked for the update. The geometry is
+    only read for polygons whose measures were never stored.
+    """
+    table = GisPolygon.__table__
+    return select(
+        table.c._updated,
+        func.coalesce(table.c.min_x, func.ST_XMin(table.c.geom)),
+        func.coalesce(table.c.min_y, func.ST_YMin(table.c.geom)),
+        func.coalesce(table.c.max_x, func.ST_XMax(table.c.geom)),
+        func.coalesce(table.c.max_y, func.ST_YMax(table.c.geom))).where(
+        table.c.id == polygon_id).with_for_update()
+
+
+def update_statements(polygon_id, values):
+    """
+    Statements writing `values` from GisPolygonSerializer.update_values,
+    with the levels of detail of a new geometry.
+    """
+    table = GisPolygon.__table__
+    statements = [update(table).where(table.c.id == polygon_id).values(
+        values)]
+    if 'geom' in values:
+        lod_table = GisPolygonLOD.__table__
+        statements.append(delete(lod_table).where(
+            lod_table.c.polygon_id == polygon_id))
+        lods = [{'polygon_id': polygon_id, 'level': level, 'geom': geom}
+                for level, geom in simplified_tiers(values['geom'])]
+        if lods:
+            statements.append(insert(lod_table).values(lods))
+    return statements
+
+
+def bounds(values):
+    """
+    bbox of a new geometry in update values, None when geom is unchanged
+    or empty.
+    """
+    if values.get('min_x') is None:
+        return None
+    return values['min_x'], values['min_y'], values['max_x'], values['max_y']
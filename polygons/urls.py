@@ -1,9 +1,23 @@
 from django.urls import path
 
-from . import views
+from . import async_views, views
 
 app_name = 'polygons' 
 urlpatterns = [
     path('', views.IndexView.as_view(), name='index'),
-    path('<int:polygon_id>/', views.DetailView.as_view(), name='detail')
+    path('bulk/', views.BulkView.as_view(), name='bulk'),
+    path('batch/', views.BatchView.as_view(), name='batch'),
+    path('search/', views.SearchView.as_view(), name='search'),
+    path('aggregate/', views.AggregateView.as_view(), name='aggregate'),
+    path('changes/', views.ChangesView.as_view(), name='changes'),
+    path('export.<str:extension>', views.ExportView.as_view(),
+         name='export'),
+    path('metrics/', views.MetricsView.as_view(), name='metrics'),
+    path('metrics/prometheus/', views.PrometheusView.as_view(),
+         name='prometheus'),
+    path('tiles/<int:z>/<int:x>/<int:y>.mvt', views.TileView.as_view(),
+         name='tile'),
+    path('<int:polygon_id>/', views.DetailView.as_view(), name='detail'),
+    path('async/', async_views.index, name='async-index'),
+    path('async/<int:polygon_id>/', async_views.detail, name='async-detail'),
 ]
\ No newline at end of file
@@ -0,0 +1,130 @@
+"""
+Checks of incoming polygons, run by GeometryField on every write path.
+
+Checks run from the cheapest to the most expensive, each timed as a
+`validate_<check>` stage, so oversized payloads are rejected before they
+are parsed:
+
+- size: length of the WKT, at most POLYGONS_MAX_WKT_BYTES
+- vertices: commas of the WKT, at most POLYGONS_MAX_VERTICES
+- type: the parsed geometry is a Polygon
+- validity: GEOS is_valid, the only check that is not linear
+
+Invalid polygons are handled as POLYGONS_INVALID_GEOMETRY says: `reject`
+them, `repair` them with make_valid when that gives a single polygon, or
+`warn` and store them as they are.
+
+check_polygon also runs in geometry_executor's processes, so it does not
+read settings; repairs and warnings counted there are not part of stats().
+"""
+import collections
+import logging
+import threading
+import shapely
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from . import metrics
+from .timing import stage
+
+POLICIES = ('reject', 'repair', 'warn')
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_counts = collections.Counter()
+
+
+class GeometryError(ValueError):
+    def __init__(self, check, message):
+        super().__init__(check, message)
+        self.check = check
+        self.message = message
+
+
+def count(outcome, check):
+    with _lock:
+        _counts[outcome, check] += 1
+
+
+def stats():
+    with _lock:
+        result = {outcome: {} for outcome in ('rejected', 'repaired',
+                                              'warned')}
+        for (outcome, check), value in _counts.items():
+            result[outcome][check] = value
+        return result
+
+
+metrics.register('validation', stats)
+
+
+def policy():
+    value = getattr(settings, 'POLYGONS_INVALID_GEOMETRY', 'reject')
+    if value not in POLICIES:
+        raise ImproperlyConfigured(
+            'POLYGONS_INVALID_GEOMETRY must be one of %s' % ', '.join(
+                POLICIES))
+    return value
+
+
+def check_payload(wkt):
+    """
+    Reject a WKT payload that is too large to parse, returns its number of
+    vertices.
+    """
+    if not isinstance(wkt, str):
+        raise GeometryError('type', 'polygon must be a WKT polygon')
+    max_bytes = getattr(settings, 'POLYGONS_MAX_WKT_BYTES', None)
+    with stage('validate_size'):
+        if max_bytes and len(wkt) > max_bytes:
+            raise GeometryError(
+                'size', 'polygon must be at most %d bytes of WKT' % max_bytes)
+    max_vertices = getattr(settings, 'POLYGONS_MAX_VERTICES', None)
+    with stage('validate_vertices'):
+        vertices = wkt.count(',') + 1
+        if max_vertices and vertices > max_vertices:
+            raise GeometryError(
+                'vertices', 'polygon must have at most %d vertices' %
+                max_vertices)
+    return vertices
+
+
+def check_polygon(polygon, policy):
+    """
+    The polygon, repaired under the `repair` policy when it is not valid.
+    """
+    with stage('validate_type'):
+        if polygon.geom_type != 'Polygon':
+            raise GeometryError(
+                'type', 'Expected a Polygon, got %s' % polygon.geom_type)
+    with stage('validate_validity'):
+        if polygon.is_valid:
+            return polygon
+        reason = shapely.is_valid_reason(polygon)
+    if policy == 'warn':
+        logger.warning('Storing an invalid polygon: %s', reason)
+        count('warned', 'validity')
+        return polygon
+    if policy == 'repair':
+        with stage('validate_repair'):
+            repaired = repair(polygon)
+        if repaired is not None:
+            count('repaired', 'validity')
+            return repaired
+        raise GeometryError(
+            'validity', 'polygon is not valid (%s) and cannot be repaired '
+            'into a single polygon' % reason)
+    raise GeometryError('validity', 'polygon is not valid: %s' % reason)
+
+
+def repair(polygon):
+    """
+    make_valid() of a polygon without the lines and points it may leave,
+    None when that is not a single polygon.
+    """
+    repaired = shapely.make_valid(polygon)
+    if repaired.geom_type == 'Polygon':
+        return repaired
+    parts = [part for part in getattr(repaired, 'geoms', [])
+             if part.geom_type == 'Polygon']
+    return parts[0] if len(parts) == 1 else None
@@ -1,22 +1,178 @@
 import io
 from rest_framework.parsers import JSONParser
 import json
-from django.http import HttpResponse, Http404
+import os
+import tempfile
+import time
+from django.conf import settings
+from django.http import (
+    FileResponse, HttpResponse, Http404, StreamingHttpResponse)
 from django.shortcuts import render
+from django.urls import reverse
+from django.utils.html import format_html
+from django.utils.http import parse_etags
 from rest_framework import status, serializers
-from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.views import APIView
-from .models import Session, GisPolygon
-from .serializers import GisPolygonSerializer
+from sqlalchemy import Integer, any_, insert, literal, tuple_
+from sqlalchemy.dialects.postgresql import ARRAY
+from . import metrics
+from .aggregates import aggregate
+from .cache import CachedResponse, make_etag, response_cache
+from .changes import (
+    change_key, changes, expired, format_cursor, parse_cursor,
+    serialize_changes, tombstone)
+from .encoding import db_encoded_geometry, polygon_query
+from .export import WRITERS, export, export_params, stream_ndjson
+from .filters import search_filter
+from .lod import levels, lod_geometry, lod_params, simplified_tiers, with_lod
+from .models import GisPolygon, GisPolygonLOD, RequestSession, Session
+from .renderers import (
+    LIST_RENDERERS, POLYGON_RENDERERS, PolygonJSONRenderer, WKBJSONRenderer)
+from .serializers import GeometryField, GisPolygonSerializer
+from .tiles import (
+    invalidate_bounds, invalidate_tiles, tile_cache, tile_exists, tile_query)
+from .timing import stage
+from .updates import bounds, expected_versions, lock_query, update_statements
+
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+INDEX_STREAM_BATCH = 1000
+
+
+def page_params(params):
+    """
+    `after` and `limit` query parameters of keyset-paginated endpoints.
+    """
+    try:
+        after = int(params.get('after', 0))
+    except ValueError:
+        raise serializers.ValidationError('after must be an integer')
+    return after, limit_param(params)
+
+
+def limit_param(params):
+    try:
+        limit = int(params.get('limit', PAGE_SIZE))
+    except ValueError:
+        raise serializers.ValidationError('limit must be an integer')
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+SORT_COLUMNS = {'id': GisPolygon.id, 'area': GisPolygon.area,
+                'perimeter': GisPolygon.perimeter,
+                'vertex_count': GisPolygon.vertex_count}
+
+
+def sort_params(params):
+    """
+    Column and direction of the `sort` query parameter, e.g. `-area`, and
+    the `after` key to continue after: an id when sorting by id,
+    `<value>,<id>` otherwise.
+    """
+    sort = params.get('sort', 'id')
+    column = SORT_COLUMNS.get(sort.lstrip('-'))
+    if column is None:
+        raise serializers.ValidationError(
+            'sort must be one of %s, prefixed with - for descending' %
+            ', '.join(SORT_COLUMNS))
+    after = params.get('after')
+    try:
+        if after is not None and column is GisPolygon.id:
+            after = (int(after),)
+        elif after is not None:
+            value, polygon_id = after.rsplit(',', 1)
+            after = (float(value), int(polygon_id))
+    except ValueError:
+        raise serializers.ValidationError(
+            'after must be the next_after of the previous page')
+    return column, sort.startswith('-'), after
+
+
+def sorted_page(query, column, descending, after, limit):
+    """
+    Keyset page of a query sorted by a column and id, and the `after` of
+    the next page, if any. Polygons without a value of the column are left
+    out, see the buildmeasures command.
+    """
+    keys = [GisPolygon.id]
+    if column is not GisPolygon.id:
+        keys.insert(0, column)
+        query = query.filter(column.isnot(None))
+    if after is not None:
+        position = tuple_(*keys) if len(keys) > 1 else keys[0]
+        after = tuple_(*after) if len(keys) > 1 else after[0]
+        query = query.filter(
+            position < after if descending else position > after)
+    query = query.order_by(*(key.desc() if descending else key
+                             for key in keys))
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    last = rows[limit - 1]
+    if column is GisPolygon.id:
+        return rows[:limit], last.id
+    return rows[:limit], '%r,%d' % (getattr(last, column.key), last.id)
+
+
+def keyset_page(query, limit):
+    """
+    Rows of a query ordered by id and the id to continue after, if any.
+    """
+    rows = query.limit(limit + 1).all()
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1].id
+    return rows, None
+
+
+def index_query(session, after):
+    """
+    Listing query restricted to the columns index.html needs, keyed on id.
+    """
+    return session.query(GisPolygon.id, GisPolygon.name).filter(
+        GisPolygon.id > after).order_by(GisPolygon.id)
+
+
+def stream_index(after):
+    """
+    Render the polygon list chunk by chunk from a server-side cursor.
+    """
+    with Session() as session:
+        rows = index_query(session, after).yield_per(INDEX_STREAM_BATCH)
+        chunk = ['<ul>\n']
+        empty = True
+        for row in rows:
+            empty = False
+            chunk.append(format_html(
+                '    <li><a href="{}">{}</a></li>\n',
+                reverse('polygons:detail', args=[row.id]), row.name))
+            if len(chunk) >= INDEX_STREAM_BATCH:
+                yield ''.join(chunk)
+                chunk = []
+        if empty:
+            yield '<p>No polygons are available</p>'
+        else:
+            chunk.append('</ul>')
+            yield ''.join(chunk)
 
 
 class IndexView(APIView):
     def get(self, request):
-        with Session() as session:
-            polygon_list = session.query(GisPolygon).all()
-            context = {'polygon_list': polygon_list}
-            return render(request, 'polygons/index.html', context)
+        try:
+            after, limit = page_params(request.query_params)
+        except serializers.ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        if request.query_params.get('stream'):
+            return StreamingHttpResponse(stream_index(after))
+        session = RequestSession()
+        polygon_list, next_after = keyset_page(
+            index_query(session, after), limit)
+        context = {'polygon_list': polygon_list,
+                   'next_after': next_after,
+                   'limit': limit}
+        return render(request, 'polygons/index.html', context)
 
     def post(self, request):
         stream = io.BytesIO(request.body)
@@ -26,53 +182,468 @@ class IndexView(APIView):
             return Response(serializer.errors,
                             status=status.HTTP_400_BAD_REQUEST)
         polygon = serializer.save()
-        with Session() as session:
-            with session.begin():
-                session.add(polygon)
-            return Response({'id': polygon.id}, status=status.HTTP_201_CREATED)
+        session = RequestSession()
+        with session.begin():
+            session.add(polygon)
+        invalidate_tiles([polygon.geom])
+        return Response({'id': polygon.id}, status=status.HTTP_201_CREATED)
+
+
+BULK_CHUNK_SIZE = 1000
+
+
+def parse_bulk_body(request):
+    """
+    Items of a JSON array body, or of an NDJSON body with one item per line.
+
+    Malformed NDJSON lines are kept as raw strings, so validation reports
+    them as per-item errors.
+    """
+    if request.content_type == 'application/x-ndjson':
+        items = []
+        for line in request.body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                items.append(line.decode(errors='replace'))
+        return items
+    data = JSONParser().parse(io.BytesIO(request.body))
+    if not isinstance(data, list):
+        raise serializers.ValidationError('Expected a list of polygons')
+    return data
+
+
+def insert_polygons(session, rows):
+    """
+    Insert rows with one multi-row INSERT ... RETURNING id per chunk, and
+    their simplified geometries with another one, all in one transaction so
+    a failure writes none of them.
+    """
+    table = GisPolygon.__table__
+    ids = []
+    with session.begin():
+        for start in range(0, len(rows), BULK_CHUNK_SIZE):
+            chunk = rows[start:start + BULK_CHUNK_SIZE]
+            result = session.execute(
+                insert(table).values(chunk).returning(table.c.id))
+            chunk_ids = result.scalars().all()
+            lod_rows = [{'polygon_id': polygon_id, 'level': level,
+                         'geom': geom}
+                        for polygon_id, row in zip(chunk_ids, chunk)
+                        for level, geom in simplified_tiers(row['geom'])]
+            if lod_rows:
+                session.execute(
+                    insert(GisPolygonLOD.__table__).values(lod_rows))
+            ids.extend(chunk_ids)
+    return ids
+
+
+class BulkView(APIView):
+    def post(self, request):
+        try:
+            items = parse_bulk_body(request)
+        except serializers.ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        serializer = GisPolygonSerializer(
+            data=items, many=True, context={'batch_reprojection': True})
+        valid, errors = serializer.validate_items()
+        rows = serializer.create_rows(
+            validated_data for _, validated_data in valid)
+        session = RequestSession()
+        ids = insert_polygons(session, rows)
+        invalidate_tiles(row['geom'] for row in rows)
+        results = [None] * len(items)
+        for (index, _), polygon_id in zip(valid, ids):
+            results[index] = {'id': polygon_id}
+        for index, error in errors.items():
+            results[index] = {'errors': error}
+        if not errors:
+            code = status.HTTP_201_CREATED
+        elif not valid:
+            code = status.HTTP_400_BAD_REQUEST
+        else:
+            code = status.HTTP_207_MULTI_STATUS
+        return Response(results, status=code)
 
 
 DEFAULT_CRS = 'epsg:4326'
 
 
+class SearchView(APIView):
+    renderer_classes = LIST_RENDERERS
+
+    def get(self, request):
+        crs = request.query_params.get('crs', DEFAULT_CRS)
+        try:
+            column, descending, after = sort_params(request.query_params)
+            limit = limit_param(request.query_params)
+            lod, tolerance = lod_params(request.query_params)
+            condition = search_filter(request.query_params)
+        except serializers.ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        geometry_format = request.accepted_renderer.geometry_format
+        geom = lod_geometry(lod, tolerance)
+        encoded_geometry = db_encoded_geometry(geometry_format, crs, geom)
+        context = {'crs': crs, 'geometry_format': geometry_format,
+                   'encoded_in_db': encoded_geometry is not None}
+        session = RequestSession()
+        query = with_lod(polygon_query(session, encoded_geometry, geom), lod)
+        polygon_list, next_after = sorted_page(
+            query.filter(condition), column, descending, after, limit)
+        try:
+            serializer = GisPolygonSerializer(
+                polygon_list, many=True, context=context)
+            with stage('serialize'):
+                results = serializer.data
+        except serializers.ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'results': results, 'next_after': next_after})
+
+
+BATCH_STREAM_SIZE = 100
+
+
+def batch_ids(data):
+    """
+    Distinct ids of a batch read in request order, from a list or a comma
+    separated string, at most POLYGONS_BATCH_MAX_IDS of them.
+    """
+    if isinstance(data, dict):
+        data = data.get('ids')
+    if isinstance(data, str):
+        data = [value for value in data.split(',') if value.strip()]
+    if not isinstance(data, list) or not data:
+        raise serializers.ValidationError('ids must be a list of integers')
+    try:
+        ids = list(dict.fromkeys(int(value) for value in data))
+    except (TypeError, ValueError):
+        raise serializers.ValidationError('ids must be a list of integers')
+    limit = getattr(settings, 'POLYGONS_BATCH_MAX_IDS', MAX_PAGE_SIZE)
+    if len(ids) > limit:
+        raise serializers.ValidationError(
+            'At most %d ids can be read at once' % limit)
+    return ids
+
+
+def stream_batch(ids, rows, context):
+    """
+    JSON array of the polygons of `rows` in the order of `ids`, with an
+    error entry for every id that does not exist. Polygons are serialized
+    BATCH_STREAM_SIZE at a time as the response is sent.
+    """
+    found = {row.id: row for row in rows}
+    encoder = JSONEncoder()
+    yield '['
+    for start in range(0, len(ids), BATCH_STREAM_SIZE):
+        chunk = ids[start:start + BATCH_STREAM_SIZE]
+        serializer = GisPolygonSerializer(
+            [found[polygon_id] for polygon_id in chunk
+             if polygon_id in found], many=True, context=context)
+        with stage('serialize'):
+            results = {result['id']: result for result in serializer.data}
+        yield (',' if start else '') + ','.join(
+            encoder.encode(results.get(polygon_id) or {
+                'id': polygon_id, 'errors': ['Polygon not found']})
+            for polygon_id in chunk)
+    yield ']'
+
+
+class BatchView(APIView):
+    """
+    Polygons by id, from `?ids=1,2,3` or a POST body with a list of ids,
+    fetched with one query and reprojected with one transform call per
+    slice of BATCH_STREAM_SIZE.
+    """
+    renderer_classes = (PolygonJSONRenderer, WKBJSONRenderer)
+
+    def get(self, request):
+        return self.read(request, request.query_params.get('ids'))
+
+    def post(self, request):
+        return self.read(request, request.data)
+
+    def read(self, request, data):
+        crs = request.query_params.get('crs', DEFAULT_CRS)
+        if crs.upper() != GeometryField.DB_CRS and \
+                crs.upper() not in GeometryField.SUPPORTED_CRS:
+            return Response('Incorrect CRS value %s' % crs,
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            ids = batch_ids(data)
+            lod, tolerance = lod_params(request.query_params)
+        except serializers.ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        geometry_format = request.accepted_renderer.geometry_format
+        geom = lod_geometry(lod, tolerance)
+        encoded_geometry = db_encoded_geometry(geometry_format, crs, geom)
+        context = {'crs': crs, 'geometry_format': geometry_format,
+                   'encoded_in_db': encoded_geometry is not None,
+                   'batch_reprojection': True}
+        session = RequestSession()
+        query = with_lod(polygon_query(session, encoded_geometry, geom), lod)
+        polygons = query.filter(
+            GisPolygon.id == any_(literal(ids, ARRAY(Integer)))).all()
+        return StreamingHttpResponse(
+            stream_batch(ids, polygons, context),
+            content_type=request.accepted_media_type)
+
+
+def invalidate_cached_responses(polygon_id):
+    response_cache.invalidate(
+        polygon_id, GeometryField.SUPPORTED_CRS,
+        [renderer.format for renderer in POLYGON_RENDERERS], levels())
+
+
 class DetailView(APIView):
+    renderer_classes = POLYGON_RENDERERS
+
     def get(self, request, polygon_id):
-        with Session() as session:
-            polygon = session.query(GisPolygon).filter_by(
-                id=polygon_id).first()
+        """
+        Polygon at `lod`, which is cached, or simplified with `tolerance`,
+        which is not.
+        """
+        crs = request.query_params.get('crs', DEFAULT_CRS)
+        try:
+            lod, tolerance = lod_params(request.query_params)
+        except serializers.ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        renderer = request.accepted_renderer
+        key = (polygon_id, crs.upper(), renderer.format, lod)
+        cached = None
+        if tolerance is None:
+            cached = response_cache.get(key)
+        if cached is None:
+            generation = response_cache.generation(polygon_id)
+            geom = lod_geometry(lod, tolerance)
+            encoded_geometry = db_encoded_geometry(
+                renderer.geometry_format, crs, geom)
+            context = {'crs': crs, 'geometry_format': renderer.geometry_format,
+                       'encoded_in_db': encoded_geometry is not None}
+            session = RequestSession()
+            query = with_lod(
+                polygon_query(session, encoded_geometry, geom), lod)
+            polygon = query.filter(GisPolygon.id == polygon_id).first()
             if polygon is None:
                 return Response(status=status.HTTP_404_NOT_FOUND)
-            crs = request.query_params.get('crs', DEFAULT_CRS)
             try:
-                serializer = GisPolygonSerializer(polygon, context={'crs': crs})
-                polygon_json = JSONRenderer().render(serializer.data)
+                serializer = GisPolygonSerializer(polygon, context=context)
+                with stage('serialize'):
+                    data = serializer.data
             except serializers.ValidationError as e:
                 return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
-            return HttpResponse(polygon_json, status=status.HTTP_200_OK)
+            with stage('render'):
+                content = renderer.render(data, request.accepted_media_type,
+                                          self.get_renderer_context())
+            content_type = request.accepted_media_type
+            if renderer.charset:
+                content_type += '; charset=%s' % renderer.charset
+            detail = lod if tolerance is None else 't%r' % tolerance
+            cached = CachedResponse(
+                make_etag(polygon_id, polygon._updated, *key[1:3], detail),
+                content, content_type)
+            if tolerance is None:
+                response_cache.set(key, cached, generation)
+        etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        if cached.etag in etags or '*' in etags:
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = HttpResponse(cached.content,
+                                    content_type=cached.content_type)
+        response['ETag'] = cached.etag
+        return response
 
     def patch(self, request, polygon_id):
-        with Session() as session:
-            with session.begin():
-                existing_polygon = session.query(GisPolygon).filter_by(
-                    id=polygon_id).first()
-                if existing_polygon is None:
-                    return Response(status=status.HTTP_404_NOT_FOUND)
-                stream = io.BytesIO(request.body)
-                data = JSONParser().parse(stream)
-                serializer = GisPolygonSerializer(
-                    existing_polygon, data=data, partial=True)
-                if not serializer.is_valid():
-                    return Response(serializer.errors,
-                                    status=status.HTTP_400_BAD_REQUEST)
-                polygon = serializer.save()
-                session.add(polygon)
-            return Response(status=status.HTTP_200_OK)
+        """
+        Write the fields of the payload only, see polygons.updates. 412
+        when If-Match or `_updated` name an older version of the polygon.
+        """
+        stream = io.BytesIO(request.body)
+        data = JSONParser().parse(stream)
+        serializer = GisPolygonSerializer(data=data, partial=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors,
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            versions = expected_versions(
+                polygon_id, request.META.get('HTTP_IF_MATCH'), data)
+        except serializers.ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        values = serializer.update_values(serializer.validated_data)
+        session = RequestSession()
+        with session.begin():
+            row = session.execute(lock_query(polygon_id)).first()
+            if row is None:
+                return Response(status=status.HTTP_404_NOT_FOUND)
+            if any(row._updated not in version for version in versions):
+                return Response(status=status.HTTP_412_PRECONDITION_FAILED)
+            for statement in update_statements(polygon_id, values):
+                session.execute(statement)
+        invalidate_cached_responses(polygon_id)
+        invalidate_bounds([tuple(row)[1:], bounds(values)])
+        return Response({'_updated': serializer.fields['_updated']
+                         .to_representation(values['_updated'])})
 
     def delete(self, request, polygon_id):
-        with Session() as session:
+        session = RequestSession()
+        with session.begin():
+            polygon = session.get(GisPolygon, polygon_id)
+            if not polygon:
+                return Response(status=status.HTTP_404_NOT_FOUND)
+            geom = polygon.geom
+            session.delete(polygon)
+            session.execute(tombstone(polygon_id))
+        invalidate_cached_responses(polygon_id)
+        invalidate_tiles([geom])
+        return Response(status=status.HTTP_200_OK)
+
+
+CHANGES_STREAM_BATCH = 1000
+
+
+def stream_timeout(params):
+    """
+    `timeout` query parameter of a change stream, at most and by default
+    POLYGONS_CHANGES_STREAM_TIMEOUT seconds.
+    """
+    limit = getattr(settings, 'POLYGONS_CHANGES_STREAM_TIMEOUT', 300)
+    try:
+        timeout = int(params.get('timeout', limit))
+    except ValueError:
+        raise serializers.ValidationError('timeout must be an integer')
+    return max(0, min(timeout, limit))
+
+
+def stream_changes(cursor, context, encoded_geometry, timeout):
+    """
+    NDJSON lines of the changes after a cursor, then of new changes every
+    POLYGONS_CHANGES_POLL_INTERVAL seconds for `timeout` seconds. Polls
+    without changes send a blank line to keep the connection alive.
+    """
+    deadline = time.monotonic() + timeout
+    interval = getattr(settings, 'POLYGONS_CHANGES_POLL_INTERVAL', 5)
+    with Session() as session:
+        while True:
             with session.begin():
-                polygon = session.get(GisPolygon, polygon_id)
-                if not polygon:
-                    return Response(status=status.HTTP_404_NOT_FOUND)
-                session.delete(polygon)
-            return Response(status=status.HTTP_200_OK)
+                rows, more = changes(session, cursor, CHANGES_STREAM_BATCH,
+                                     encoded_geometry)
+                entries = serialize_changes(rows, context)
+            if rows:
+                cursor = change_key(rows[-1])
+            yield ''.join(json.dumps(entry, cls=JSONEncoder) + '\n'
+                          for entry in entries) or '\n'
+            if more:
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(interval, remaining))
+
+
+class ChangesView(APIView):
+    def get(self, request):
+        """
+        Changes after `cursor`, a page of `limit` or, with `stream`, all of
+        them and the ones that follow for `timeout` seconds as NDJSON.
+        """
+        crs = request.query_params.get('crs', DEFAULT_CRS)
+        if crs.upper() != GeometryField.DB_CRS and \
+                crs.upper() not in GeometryField.SUPPORTED_CRS:
+            return Response('Incorrect CRS value %s' % crs,
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            cursor = parse_cursor(request.query_params.get('cursor'))
+            limit = limit_param(request.query_params)
+            timeout = stream_timeout(request.query_params)
+        except serializers.ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        session = RequestSession()
+        if expired(session, cursor):
+            return Response(
+                'Deletions older than the cursor were pruned, sync from '
+                'scratch without a cursor', status=status.HTTP_410_GONE)
+        encoded_geometry = db_encoded_geometry('wkt', crs)
+        context = {'crs': crs, 'encoded_in_db': encoded_geometry is not None}
+        if request.query_params.get('stream'):
+            return StreamingHttpResponse(
+                stream_changes(cursor, context, encoded_geometry, timeout),
+                content_type='application/x-ndjson')
+        rows, more = changes(session, cursor, limit, encoded_geometry)
+        with stage('serialize'):
+            results = serialize_changes(rows, context)
+        next_cursor = request.query_params.get('cursor')
+        if rows:
+            next_cursor = format_cursor(rows[-1])
+        return Response({'results': results, 'next_cursor': next_cursor,
+                         'more': more})
+
+
+class ExportView(APIView):
+    def get(self, request, extension):
+        """
+        Polygons matching the `class_id`, `bbox`, `geom` and `props` filters
+        as one of polygons.export.WRITERS in `crs`. NDJSON is streamed,
+        files are written to a temporary file first.
+        """
+        if extension not in WRITERS:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        try:
+            crs, condition = export_params(request.query_params)
+        except serializers.ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        filename = 'polygons.%s' % extension
+        if extension == 'ndjson':
+            response = StreamingHttpResponse(
+                stream_ndjson(crs, condition),
+                content_type=WRITERS[extension].content_type)
+            response['Content-Disposition'] = \
+                'attachment; filename="%s"' % filename
+            return response
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, filename)
+            export(path, extension, crs, condition)
+            # The open file outlives the directory on POSIX
+            f = open(path, 'rb')
+        return FileResponse(f, as_attachment=True, filename=filename,
+                            content_type=WRITERS[extension].content_type)
+
+
+class AggregateView(APIView):
+    def get(self, request):
+        """
+        Count, area and bbox of the polygons matching the filters of
+        SearchView, grouped by `group_by`, see polygons.aggregates.
+        """
+        session = RequestSession()
+        try:
+            groups, source = aggregate(session, request.query_params)
+        except serializers.ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'groups': groups, 'source': source})
+
+
+class TileView(APIView):
+    def get(self, request, z, x, y):
+        if not tile_exists(z, x, y):
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        content = tile_cache.get(z, x, y)
+        if content is None:
+            version = tile_cache.version()
+            session = RequestSession()
+            content = session.execute(tile_query(z, x, y)).scalar() or b''
+            content = bytes(content)
+            tile_cache.set(z, x, y, content, version)
+        return HttpResponse(content,
+                            content_type='application/vnd.mapbox-vector-tile')
+
+
+class MetricsView(APIView):
+    def get(self, request):
+        return Response(metrics.collect())
+
+
+class PrometheusView(APIView):
+    def get(self, request):
+        return HttpResponse(metrics.prometheus(),
+                            content_type='text/plain; version=0.0.4')